@@ -0,0 +1,133 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from prompt import PROMPT_VERSION
+
+# ---------- Persistent LLM Answer Cache ----------
+# Answers are keyed by the normalised question, the workbook version and the
+# prompt version, so a new file or a prompt edit can never serve a stale answer.
+# Each workbook version is its own LRU of at most MAX_ENTRIES answers, so a busy
+# dataset never evicts the answers of a quieter one.
+
+CACHE_PATH = os.environ.get("KRISPR_ANSWER_CACHE", "answer_cache.sqlite3")
+MAX_ENTRIES = int(os.environ.get("KRISPR_ANSWER_CACHE_MAX", 5000))   # per workbook version
+TTL_SECONDS = int(os.environ.get("KRISPR_ANSWER_CACHE_TTL", 7 * 24 * 3600))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    dataset_version TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed);
+CREATE INDEX IF NOT EXISTS answers_version_accessed ON answers (dataset_version, accessed);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+
+def cache_key(question, dataset_version):
+    raw = "\x1f".join([normalize_question(question), dataset_version, PROMPT_VERSION])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """SQLite-backed answer cache with TTL and size-bounded LRU eviction per workbook version."""
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # WAL lets several Streamlit worker processes read while one writes
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _bump(self, name, amount=1):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, question, dataset_version):
+        key = cache_key(question, dataset_version)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT answer, created FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._bump("expired")
+                row = None
+            if row is None:
+                self._bump("misses")
+                return None
+            self._conn.execute("UPDATE answers SET accessed = ? WHERE key = ?", (now, key))
+            self._bump("hits")
+            return row[0]
+
+    def put(self, question, dataset_version, answer):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key(question, dataset_version), dataset_version,
+                 normalize_question(question), answer, now, now),
+            )
+            evicted = self._conn.execute(
+                "DELETE FROM answers WHERE key IN ("
+                "SELECT key FROM answers WHERE dataset_version = ? ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (dataset_version, self.max_entries),
+            ).rowcount
+            if evicted:
+                self._bump("evictions", evicted)
+
+    def invalidate(self, version):
+        """Drop the answers for one workbook version, e.g. the one a refresh replaced."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answers WHERE dataset_version = ?", (version,))
+
+    def entries_by_version(self):
+        """{workbook version: stored answers}."""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT dataset_version, COUNT(*) FROM answers GROUP BY dataset_version"
+            ).fetchall())
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "expired": counters.get("expired", 0),
+            "entries": entries,
+            "hit_rate": counters.get("hits", 0) / lookups if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """The process-wide AnswerCache, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache()
+        return _cache
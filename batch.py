@@ -0,0 +1,234 @@
+"""Answer a file of questions against one workbook.
+
+    python batch.py questions.csv --output answers.csv
+    python batch.py questions.jsonl --workbook latest_file.xlsx --concurrency 8 --rate 120
+    python batch.py questions.csv --dataset brand-x
+
+Questions come from a CSV (a "question" column, else the first column) or a
+JSONL file ({"question": ...} objects or plain strings); an optional "id" is
+carried through. Results are written as CSV or JSONL, chosen by extension.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from answer_cache import cache_key, get_answer_cache
+from connect import _error_message, generate_answer
+from dataset import load_dataset
+from intents import answer_locally
+from metrics import Trace
+from registry import dataset_path
+
+# ---------- Offline Batch Questions ----------
+# The workbook is loaded once for the whole batch. Questions with a local or
+# cached answer never reach the LLM; the rest fan out over a bounded pool whose
+# request rate is capped, and identical questions share one generation.
+
+BATCH_CONCURRENCY = int(os.environ.get("KRISPR_BATCH_CONCURRENCY", 4))
+BATCH_RATE_PER_MINUTE = float(os.environ.get("KRISPR_BATCH_RATE", 60))  # 0 disables the limit
+RESULT_FIELDS = ["id", "question", "answer", "route", "seconds", "prompt_tokens", "completion_tokens", "error"]
+
+
+class RateLimiter:
+    """Spaces calls at least 60/rate_per_minute seconds apart across threads."""
+
+    def __init__(self, rate_per_minute):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _decode(source):
+    """Text of a path or an uploaded (binary or text) file object."""
+    if isinstance(source, str):
+        with open(source, encoding="utf-8-sig") as fh:
+            return fh.read()
+    data = source.read()
+    return data.decode("utf-8-sig") if isinstance(data, bytes) else data
+
+
+def read_questions(source, fmt=None):
+    """[{"id", "question"}] from a CSV or JSONL path or file object."""
+    name = source if isinstance(source, str) else getattr(source, "name", "")
+    fmt = fmt or ("jsonl" if name.lower().endswith((".jsonl", ".json")) else "csv")
+    text = _decode(source)
+    items = []
+    if fmt == "jsonl":
+        for line in text.splitlines():
+            if line.strip():
+                value = json.loads(line)
+                items.append(value if isinstance(value, dict) else {"question": value})
+    else:
+        rows = list(csv.reader(io.StringIO(text)))
+        if rows:
+            header = [h.strip().lower() for h in rows[0]]
+            if "question" in header:
+                items = [dict(zip(header, row)) for row in rows[1:]]
+            else:
+                items = [{"question": row[0]} for row in rows if row]
+    questions = []
+    for position, item in enumerate(items, 1):
+        question = str(item.get("question") or "").strip()
+        if question:
+            questions.append({"id": item.get("id") or position, "question": question})
+    return questions
+
+
+def _result(item, trace, answer, started, error=None):
+    record = trace.record
+    return {
+        "id": item["id"], "question": item["question"], "answer": answer,
+        "route": record.get("route"), "seconds": round(time.monotonic() - started, 3),
+        "prompt_tokens": record.get("prompt_tokens"), "completion_tokens": record.get("completion_tokens"),
+        "error": error,
+    }
+
+
+def answer_batch(questions, excel_path, concurrency=BATCH_CONCURRENCY, rate_per_minute=BATCH_RATE_PER_MINUTE,
+                 progress=None):
+    """Answer every question against one loaded workbook; results keep the input order.
+
+    progress(done, total) is called after each answer.
+    """
+    dataset = load_dataset(excel_path)
+    answer_cache = get_answer_cache()
+    results = [None] * len(questions)
+    done = 0
+
+    def report():
+        if progress:
+            progress(done, len(questions))
+
+    # Local and cached answers first: they cost no LLM call
+    pending = {}   # cache key -> indexes of the questions sharing it
+    for index, item in enumerate(questions):
+        started = time.monotonic()
+        trace = Trace(item["question"])
+        trace.set(batch=True, dataset_version=dataset.version)
+        try:
+            with trace.stage("local"):
+                answer = answer_locally(item["question"], dataset)
+            route = "local"
+            if answer is None:
+                with trace.stage("answer_cache"):
+                    answer = answer_cache.get(item["question"], dataset.version)
+                route = "cached"
+        except Exception as e:
+            trace.set(route="error", error=str(e))
+            trace.finish()
+            results[index] = _result(item, trace, _error_message(e), started, str(e))
+            done += 1
+            report()
+            continue
+        if answer is None:
+            pending.setdefault(cache_key(item["question"], dataset.version), []).append(index)
+            continue
+        trace.set(route=route)
+        trace.finish()
+        results[index] = _result(item, trace, answer, started)
+        done += 1
+        report()
+
+    limiter = RateLimiter(rate_per_minute)
+
+    def generate(index):
+        item = questions[index]
+        trace = Trace(item["question"])
+        trace.set(batch=True, dataset_version=dataset.version)
+        submitted = time.monotonic()
+        try:
+            # Every LLM request of the answer (query planning when it runs, then the answer itself) waits for a slot
+            answer = "".join(generate_answer(item["question"], dataset, answer_cache, trace, submitted, limiter))
+            error = None
+        except Exception as e:
+            trace.set(route="error", error=str(e))
+            answer, error = _error_message(e), str(e)
+        trace.finish()
+        return trace, answer, error, submitted
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="krispr-batch") as pool:
+        futures = {pool.submit(generate, indexes[0]): indexes for indexes in pending.values()}
+        for future in as_completed(futures):
+            trace, answer, error, started = future.result()
+            for position, index in enumerate(futures[future]):
+                result = _result(questions[index], trace, answer, started, error)
+                if position:
+                    result["route"] = "coalesced"
+                results[index] = result
+                done += 1
+                report()
+    return results
+
+
+def write_results(results, path):
+    """Write results as JSONL or CSV, by the path's extension."""
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        if path.lower().endswith((".jsonl", ".json")):
+            for result in results:
+                fh.write(json.dumps(result, ensure_ascii=False) + "\n")
+        else:
+            writer = csv.DictWriter(fh, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    return path
+
+
+def results_csv(results):
+    """Results as CSV text, e.g. for a download button."""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS)
+    writer.writeheader()
+    writer.writerows(results)
+    return out.getvalue()
+
+
+def summarize_results(results, elapsed):
+    routes = {}
+    for result in results:
+        routes[result["route"]] = routes.get(result["route"], 0) + 1
+    return {"questions": len(results), "seconds": round(elapsed, 2), "routes": routes}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help="CSV or JSONL file of questions")
+    parser.add_argument("--workbook", default="latest_file.xlsx")
+    parser.add_argument("--dataset", help="registered dataset name (overrides --workbook)")
+    parser.add_argument("--output", help="results file (.csv or .jsonl); default <questions>.answers.csv")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=BATCH_RATE_PER_MINUTE, help="LLM calls per minute, 0 = no limit")
+    args = parser.parse_args(argv)
+
+    workbook = dataset_path(args.dataset) if args.dataset else args.workbook
+    questions = read_questions(args.questions)
+    output = args.output or os.path.splitext(args.questions)[0] + ".answers.csv"
+    started = time.monotonic()
+    results = answer_batch(
+        questions, workbook, concurrency=args.concurrency, rate_per_minute=args.rate,
+        progress=lambda done, total: print(f"\r{done}/{total} answered", end="", file=sys.stderr, flush=True),
+    )
+    print(file=sys.stderr)
+    write_results(results, output)
+    summary = summarize_results(results, time.monotonic() - started)
+    print(f"✅ {summary['questions']} answers in {summary['seconds']}s {summary['routes']} -> {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
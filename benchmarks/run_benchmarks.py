@@ -0,0 +1,306 @@
+"""Time workbook loading, business logic, prompt building and the chat path.
+
+    python -m benchmarks.run_benchmarks --rows 100000 --output bench.json
+    python -m benchmarks.run_benchmarks --rows 100000 --compare bench.json
+
+Run from the repository root. The LLM is the deterministic offline stub and the
+answer cache lives in a temporary directory, so no API key is needed and the
+real cache is never touched.
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.synthetic_workbook import XLSX_MAX_ROWS, generate_sheets, write_workbook
+
+# A placeholder workbook stands in for sizes Excel cannot hold; its snapshot carries the full data
+PLACEHOLDER_ROWS = 1_000
+
+
+class Bench:
+    """Collects timings as {"group.name": {"min_ms", "median_ms", "mean_ms", "runs"}}."""
+
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+
+    def run(self, group, name, fn, setup=None, repeat=None):
+        key = f"{group}.{name}"
+        if self.only and self.only not in key:
+            return None
+        timings, result = [], None
+        for _ in range(repeat or self.repeat):
+            arg = setup() if setup else None
+            start = time.perf_counter()
+            try:
+                result = fn(arg) if setup else fn()
+            except Exception as e:
+                self.results[key] = {"error": f"{type(e).__name__}: {e}"}
+                print(f"{group:<10} {name:<52} {'failed':>10}  {type(e).__name__}: {e}", flush=True)
+                return None
+            timings.append((time.perf_counter() - start) * 1000)
+        self.results[key] = {
+            "min_ms": min(timings),
+            "median_ms": statistics.median(timings),
+            "mean_ms": statistics.fmean(timings),
+            "runs": len(timings),
+        }
+        print(f"{group:<10} {name:<52} {min(timings):>10.2f} {statistics.median(timings):>10.2f} ms", flush=True)
+        return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _stage_workbook(workdir, rows, weeks, seed):
+    """Write the workbook, or a placeholder plus a full snapshot past Excel's row limit."""
+    sheets = generate_sheets(rows, weeks=weeks, seed=seed)
+    path = os.path.join(workdir, "synthetic.xlsx")
+    if rows <= XLSX_MAX_ROWS:
+        write_workbook(sheets, path)
+    else:
+        from dataset import file_version
+        from snapshot import write_snapshot
+
+        write_workbook(generate_sheets(PLACEHOLDER_ROWS, weeks=weeks, seed=seed), path)
+        write_snapshot(path, file_version(path), sheets)
+    return path
+
+
+def bench_loading(bench, path, rows):
+    import dataset as ds
+    from snapshot import load_snapshot, write_snapshot
+
+    version = ds.file_version(path)
+    if rows <= XLSX_MAX_ROWS:
+        sheets = bench.run("load", "read_workbook (xlsx parse)", lambda: ds.read_workbook(path), repeat=1)
+        scratch = tempfile.mkdtemp(dir=os.path.dirname(path))
+        bench.run("load", "write_snapshot", lambda: write_snapshot(os.path.join(scratch, "w.xlsx"), version, sheets),
+                  repeat=1)
+        write_snapshot(path, version, sheets if sheets is not None else ds.read_workbook(path))
+    bench.run("load", "load_snapshot", lambda: load_snapshot(path, version))
+    bench.run("load", "load_dataset (snapshot)", lambda _: ds.load_dataset(path),
+              setup=lambda: ds.invalidate_dataset(path))
+    bench.run("load", "load_dataset (snapshot) + sales sheet", lambda _: ds.load_dataset(path).sheet("Raw Data - Date Wise"),
+              setup=lambda: ds.invalidate_dataset(path))
+    bench.run("load", "load_dataset (snapshot) + all sheets", lambda _: ds.load_dataset(path).sheets,
+              setup=lambda: ds.invalidate_dataset(path))
+    ds.load_dataset(path)
+    bench.run("load", "load_dataset (cached)", lambda: ds.load_dataset(path))
+    return ds.load_dataset(path)
+
+
+def bench_partitions(bench, workdir, rows, weeks, seed):
+    """Snapshot a raw sheet whose rows are not in date order: it must still store one part per week."""
+    from snapshot import PARTS_DIR, load_snapshot_sheet, snapshot_partitions, snapshot_root, write_snapshot
+
+    sheet = "Raw Data - Date Wise"
+    sheets = {sheet: generate_sheets(rows, weeks=weeks, seed=seed, shuffle=True)[sheet]}
+    path = os.path.join(tempfile.mkdtemp(dir=workdir), "shuffled.xlsx")
+    bench.run("partition", "write_snapshot (shuffled rows)", lambda: write_snapshot(path, "shuffled", sheets),
+              repeat=1)
+    if not os.path.isdir(snapshot_root(path)):
+        write_snapshot(path, "shuffled", sheets)   # skipped by --only; the checks below still need it
+    parts = snapshot_partitions(path, "shuffled", sheet) or []
+    files = len(os.listdir(os.path.join(snapshot_root(path), PARTS_DIR)))
+    if len(parts) != weeks or files != weeks:
+        raise RuntimeError(f"{weeks} weeks of shuffled rows were stored as {len(parts)} partitions in {files} files")
+    bench.run("partition", "load_snapshot_sheet (shuffled rows)", lambda: load_snapshot_sheet(path, "shuffled", sheet))
+
+
+def bench_prepare(bench, dataset):
+    from connect import get_prompt_context
+    from dataset import Dataset
+    from prepared_data import PreparedSales, PreparedSheet, SalesCube, prepared_sales
+    from retrieval import retrieval_index
+    from sql_engine import ENGINES
+
+    raw = dataset.sheet("Raw Data - Date Wise")
+    fresh = lambda: Dataset(dataset.path, dataset.version, dataset.sheets)
+    bench.run("prepare", "PreparedSales", lambda: PreparedSales(raw))
+    frame = prepared_sales(dataset).frame
+    bench.run("prepare", "SalesCube", lambda: SalesCube(frame))
+    bench.run("prepare", "PreparedSheet Organic", lambda: PreparedSheet(dataset.sheet("Organic"), "PRODUCT NAME"))
+    bench.run("prepare", "PreparedSheet Media", lambda: PreparedSheet(dataset.sheet("Media"), "Product Name"))
+    bench.run("prepare", "get_prompt_context (build)", get_prompt_context, setup=fresh)
+    bench.run("prepare", "get_prompt_context (cached)", lambda: get_prompt_context(dataset))
+    bench.run("prepare", "retrieval_index (build)", retrieval_index, setup=fresh, repeat=min(bench.repeat, 3))
+    engine = bench.run("prepare", "SQLiteEngine (build)", lambda: ENGINES["sqlite"](dataset.sheets),
+                       repeat=min(bench.repeat, 3))
+    if engine is not None:
+        bench.run("prepare", "SQLiteEngine (weekly product query)", lambda: engine.query(
+            "SELECT iso_year, iso_week, item_description, SUM(sold_quantity) AS units FROM sales "
+            "GROUP BY 1, 2, 3 ORDER BY units DESC"))
+
+
+def _arguments(dataset):
+    """Representative arguments for every business_logic parameter name."""
+    import pandas as pd
+
+    raw = dataset.sheet("Raw Data - Date Wise")
+    organic = dataset.sheet("Organic")
+    weeks = sorted(organic["Week"].unique())
+    week = int(weeks[len(weeks) // 2])
+    dates = pd.to_datetime(raw["Local Order Date"], errors="coerce").dropna().sort_values()
+    middle = dates.iloc[len(dates) // 2] if len(dates) else pd.Timestamp("2025-01-01")
+    return {
+        "week": week, "week1": week, "week2": int(weeks[len(weeks) // 2 + 1]),
+        "product": str(organic["PRODUCT NAME"].iloc[0]),
+        "vendor": str(raw["Vendor Name"].iloc[0]),
+        "top_n": 5, "n": 5, "month": int(middle.month),
+        "start": middle.date(), "end": (middle + pd.Timedelta(days=13)).date(),
+    }
+
+
+def bench_business_logic(bench, dataset):
+    import business_logic
+    from prepared_data import prepared_sales, prepared_sheet
+
+    values = _arguments(dataset)
+    cold = {
+        "raw_data": dataset.sheet("Raw Data - Date Wise"), "organic": dataset.sheet("Organic"),
+        "media": dataset.sheet("Media"), "change": dataset.sheet("Overall Avg & Change"),
+    }
+    warm = {
+        **cold, "raw_data": prepared_sales(dataset),
+        "organic": prepared_sheet(dataset, "Organic"), "media": prepared_sheet(dataset, "Media"),
+    }
+    functions = [
+        (name, fn) for name, fn in inspect.getmembers(business_logic, inspect.isfunction)
+        if fn.__module__ == "business_logic" and not name.startswith("_") and name != "preprocess_week"
+    ]
+    for group, frames in (("logic-df", cold), ("logic", warm)):
+        for name, fn in functions:
+            params = inspect.signature(fn).parameters
+            args = {p: (frames[p] if p in frames else values[p]) for p in params if p in frames or p in values}
+            # Raw-DataFrame inputs re-prepare the sales sheet on every call, so keep those runs short
+            repeat = min(bench.repeat, 3) if group == "logic-df" and "raw_data" in args else None
+            bench.run(group, name, lambda fn=fn, args=args: fn(**args), repeat=repeat)
+
+
+def _expect_route(connect, question, path, route):
+    """Answer question once and fail unless it took the given route, so each timing measures its label."""
+    from metrics import Trace
+
+    trace = Trace(question)
+    "".join(connect._answer_stream(question, path, trace))
+    if trace.record["route"] != route:
+        raise RuntimeError(f"{question!r} took the {trace.record['route']} route, not {route}")
+
+
+def bench_chat(bench, dataset, path):
+    import connect
+    from answer_cache import get_answer_cache
+
+    values = _arguments(dataset)
+    sheets = [dataset.sheet(s) for s in ("Raw Data - Date Wise", "Organic", "Media", "Overall Avg & Change")]
+    bench.run("context", "create_data_context", lambda: connect.create_data_context(*sheets))
+
+    local_question = f"How many units were sold in week {values['week']}?"
+    # No local intent covers this, so it goes through retrieval, SQL and the (stub) LLM
+    llm_question = f"What should we focus on to grow {values['product']} next quarter?"
+    cache = get_answer_cache()
+    bench.run("chat", "main_chatbot (greeting)", lambda: connect.main_chatbot("hello", path))
+    _expect_route(connect, local_question, path, "local")
+    bench.run("chat", "main_chatbot (local intent)", lambda: connect.main_chatbot(local_question, path))
+    cache.invalidate(dataset.version)
+    _expect_route(connect, llm_question, path, "llm")
+    bench.run("chat", "main_chatbot (stub LLM, uncached)", lambda _: connect.main_chatbot(llm_question, path),
+              setup=lambda: cache.invalidate(dataset.version))
+    _expect_route(connect, llm_question, path, "cached")
+    bench.run("chat", "main_chatbot (answer cache hit)", lambda: connect.main_chatbot(llm_question, path))
+
+
+def compare(results, baseline_path, threshold):
+    """Print the median change per benchmark and return the names slower than threshold."""
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = json.load(fh)["results"]
+    regressions = []
+    print(f"\nAgainst {baseline_path} (regression threshold {threshold:.0%}):")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if "median_ms" not in current or not (before or {}).get("median_ms"):
+            continue
+        change = current["median_ms"] / before["median_ms"] - 1
+        flag = "  ⚠️ REGRESSION" if change > threshold else ""
+        print(f"  {name:<62} {before['median_ms']:>10.2f} -> {current['median_ms']:>10.2f} ms ({change:+.0%}){flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="raw sales rows in the synthetic workbook")
+    parser.add_argument("--weeks", type=int, default=26)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="run only benchmarks whose group.name contains this text")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --output run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="median slowdown flagged as a regression")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="krispr-bench-")
+    # Before the app modules are imported: they read these settings at import time
+    os.environ["KRISPR_LLM_BACKEND"] = "stub"
+    os.environ["KRISPR_LLM_STUB_DELAY"] = "0"
+    os.environ["KRISPR_ANSWER_CACHE"] = os.path.join(workdir, "answers.sqlite3")
+    os.environ["KRISPR_TRACE_LOG"] = ""
+
+    import pandas as pd
+    from schema import memory_report
+
+    print(f"Generating {args.rows:,} raw rows over {args.weeks} weeks in {workdir}", flush=True)
+    bench = Bench(args.repeat, args.only)
+    try:
+        path = _stage_workbook(workdir, args.rows, args.weeks, args.seed)
+        print(f"{'group':<10} {'benchmark':<52} {'min':>10} {'median':>10}")
+        dataset = bench_loading(bench, path, args.rows)
+        bench_partitions(bench, workdir, args.rows, args.weeks, args.seed)
+        bench_prepare(bench, dataset)
+        bench_business_logic(bench, dataset)
+        bench_chat(bench, dataset, path)
+        memory = {m["sheet"]: m["bytes"] for m in memory_report(dataset.sheets)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "rows": args.rows, "weeks": args.weeks, "seed": args.seed, "repeat": args.repeat,
+            "xlsx": args.rows <= XLSX_MAX_ROWS, "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(), "pandas": pd.__version__, "platform": platform.platform(),
+            "memory_bytes": memory,
+        },
+        "results": bench.results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nWrote {len(bench.results)} results to {args.output}")
+    if args.compare:
+        regressions = compare(bench.results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Synthetic KRISPR workbooks with the sheets and columns the app expects.
+
+    python -m benchmarks.synthetic_workbook --rows 100000 --output synthetic.xlsx
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Excel caps a sheet at 1,048,576 rows (header included)
+XLSX_MAX_ROWS = 1_048_575
+
+PRODUCTS = [
+    "Krispr Premium Baby Crispy Lettuce UAE 75g",
+    "Krispr Premium Baby Salad Mix UAE 75g",
+    "Krispr Premium Baby Butterhead Lettuce UAE 75g",
+    "Krispr Premium Baby Kale UAE 75g",
+    "Krispr Premium Baby Frisee (Easy Leaf) Lettuce UAE 75g",
+    "Krispr Premium Genovese Basil UAE 20g",
+    "Krispr Baby Plum Tomatoes - UAE, 300g",
+    "Krispr Finest Mixed Baby Plum Tomatoes - UAE, 300g",
+    "Krispr Baby Cucumbers Pack, 250g",
+    "Krispr Premium Thyme, 25g",
+    "Krispr Premium Rosemary, 40g",
+    "Krispr Premium Baby Cherry Tomatoes, 300g",
+]
+AREAS = [
+    "Dubai Marina", "Palm Jumeirah", "Al Shamkha", "Al Qusais 2", "Business Bay", "Musaffah",
+    "Al Barsha 1", "Dubai Silicon Oasis", "Jazira", "Port Saeed", "Al Jurf 2", "Khalifa - AD",
+]
+
+
+def _names(base, count, template):
+    return (base + [template.format(i) for i in range(len(base), count)])[:count]
+
+
+def generate_sheets(rows, weeks=26, products=12, vendors=27, start="2024-12-02", seed=0, shuffle=False):
+    """Build the four sheets as DataFrames; dates span `weeks` ISO weeks from `start`.
+
+    Raw rows are in date order unless shuffle is set, as in a workbook pasted
+    together from unsorted exports. Organic carries the "Org Units sold" and
+    "Avg NI SKU Organic (Fixed)" columns business_logic reads, even though the
+    production workbook currently lacks the former.
+    """
+    rng = np.random.default_rng(seed)
+    product_names = _names(PRODUCTS, products, "Krispr Synthetic Product {}, 100g")
+    vendor_names = [f"talabat mart , {area}" for area in _names(AREAS, vendors, "Area {}")]
+
+    days = rng.integers(0, weeks * 7, size=rows)
+    product_codes = rng.integers(0, len(product_names), size=rows)
+    vendor_codes = rng.integers(0, len(vendor_names), size=rows)
+    raw = pd.DataFrame({
+        "Item SKU": 900000 + product_codes,
+        "Item Description": pd.Series(np.array(product_names, dtype=object)[product_codes], dtype="str"),
+        "Vendor Name": pd.Series(np.array(vendor_names, dtype=object)[vendor_codes], dtype="str"),
+        "Local Order Date": pd.Timestamp(start) + pd.to_timedelta(days if shuffle else np.sort(days), unit="D"),
+        "Sold Quantity": rng.integers(1, 6, size=rows),
+    })
+
+    iso = pd.Series(pd.date_range(start, periods=weeks, freq="7D")).dt.isocalendar()
+    week_keys = list(zip(iso["year"].astype(int), iso["week"].astype(int)))
+    channel_names = [name.replace(" UAE ", " - UAE, ") for name in product_names]
+    grid = pd.DataFrame(
+        [(year, week, name) for year, week in week_keys for name in channel_names],
+        columns=["Year", "Week", "Product"],
+    )
+    n = len(grid)
+    cogs = rng.uniform(1, 9, n).round(2)
+    price = (cogs * rng.uniform(1.1, 1.6, n)).round(2)
+    org_sv = rng.uniform(0, 60, n).round(2)
+    share = rng.uniform(40, 100, n).round(2)
+    organic = pd.DataFrame({
+        "Week": grid["Week"], "Year": grid["Year"], "PRODUCT NAME": grid["Product"],
+        "Market/Currency": "UAE / AED", "Unit (g)": rng.choice([20, 25, 40, 75, 250, 300], n),
+        "COGS": cogs, "Sell-In Price": price, "Daily Organic SV": org_sv,
+        "Organic Share of Sales %": share, "Org Units sold": (org_sv * 7).round(),
+        "Fixed TTS": (price * 0.1).round(3),
+        "TCS": (cogs + price * 0.1).round(3),
+        "Net Income Per SKU Organic (Excl. Tax)": (price * 0.9 - cogs).round(2),
+        "Total Daily Net Income Organic (Excl. Tax)": ((price * 0.9 - cogs) * org_sv).round(2),
+        "Avg NI SKU Organic (Fixed)": (price * 0.9 - cogs - price * 0.1).round(2),
+    })
+    cpa = rng.uniform(1, 6, n).round(2)
+    media_units = rng.integers(0, 200, n).astype(float)
+    ni = (price * 0.9 - cogs - cpa).round(2)
+    media = pd.DataFrame({
+        "Week": grid["Week"], "Year": grid["Year"], "Product Name": grid["Product"],
+        "COGS": cogs, "CPA": cpa, "Fixed TTS": (price * 0.1).round(3), "TCS": (cogs + cpa + price * 0.1).round(2),
+        "Media Units Sold": media_units, "Daily MSV": (media_units / 7).round(2),
+        "Media Share %": (100 - share).round(2), "Sell-in Price": price, "NI per SKU": ni,
+        "Total Daily NI Media": (ni * media_units / 7).round(2),
+    })
+
+    metrics = ["Avg TCS Media", "Avg NI  SKU Media", "Total Daily NI Media", "Avg TCS Organic (Fixed)",
+               "Avg NI SKU Organic (Fixed)", "Total Daily NI Organic", "Avg Overall Daily SV",
+               "Avg Daily MSV", "Avg Daily OSV", "Media Share %", "Organic Share %"]
+    change = pd.DataFrame({"Week": [w for _, w in week_keys], "year": [y for y, _ in week_keys]})
+    for metric in metrics:
+        values = pd.Series(rng.uniform(0, 500, weeks).round(2))
+        change[metric] = values
+        change[metric.replace("Avg NI  SKU", "Avg NI SKU") + " % Change"] = values.pct_change().round(4)
+    change = change[["Week", "year"] + [c for c in change.columns if c not in ("Week", "year")]]
+
+    return {
+        "Raw Data - Date Wise": raw,
+        "Organic": organic,
+        "Media": media,
+        "Overall Avg & Change": change,
+    }
+
+
+def write_workbook(sheets, path):
+    """Write the sheets as an .xlsx; fails for raw sheets beyond Excel's row limit."""
+    if max(len(df) for df in sheets.values()) > XLSX_MAX_ROWS:
+        raise ValueError(f"Excel sheets hold at most {XLSX_MAX_ROWS:,} rows; benchmark larger sizes in memory")
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--weeks", type=int, default=26)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shuffle", action="store_true", help="raw rows in random rather than date order")
+    parser.add_argument("--output", default="synthetic.xlsx")
+    args = parser.parse_args(argv)
+    sheets = generate_sheets(args.rows, weeks=args.weeks, seed=args.seed, shuffle=args.shuffle)
+    write_workbook(sheets, args.output)
+    print(f"Wrote {args.rows:,} raw rows to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,160 +1,295 @@
+from datetime import date
+
 import pandas as pd
 
+from prepared_data import PreparedSheet, as_prepared_sales, as_prepared_sheet, channel_panel, week_rows
+
 # ---------- Shared Helper ----------
 def preprocess_week(df, date_col="Local Order Date"):
-    df = df.copy()
-    df["Week"] = pd.to_datetime(df[date_col]).dt.isocalendar().week
-    return df
+    iso = pd.to_datetime(df[date_col]).dt.isocalendar()
+    return df.assign(Year=iso["year"], Week=iso["week"])  # new columns only; the rest is shared
+
+def _total_for_labels(totals, labels):
+    """Sum the roll-up entries for every spelling of a name (dictionary hits, no scan)."""
+    return sum(totals.get(label, 0) for label in labels)
+
+# organic/media may be the sheet DataFrames or PreparedSheets built once per workbook version.
+def _organic(organic):
+    return as_prepared_sheet(organic, "PRODUCT NAME")
+
+def _media(media):
+    return as_prepared_sheet(media, "Product Name")
+
+def _rows(sheet):
+    return sheet.frame if isinstance(sheet, PreparedSheet) else sheet
+
+def _week_rows(sheet, week):
+    return week_rows(_rows(sheet), week)
+
+# A week is an ISO week number (that week in every year, as the sheets were first
+# written) or an (ISO year, week) tuple naming exactly one partition.
+def _week_levels(week):
+    if isinstance(week, tuple):
+        return ("Year", "Week"), (int(week[0]), int(week[1]))
+    return ("Week",), week
+
+def _week_total(sales, week):
+    levels, key = _week_levels(week)
+    return sales.cube.rollup(*levels).get(key, 0)
+
+def _within_week(sales, week, by):
+    levels, key = _week_levels(week)
+    return sales.cube.within(levels, key, by)
 
 
 # ---------- Units Sold & Quantity Insights ----------
+# raw_data may be the sheet DataFrame or a PreparedSales built once per workbook version.
+# Sold Quantity questions are answered from its aggregate cube rather than the rows.
 def get_total_units_sold(raw_data, week):
-    df = preprocess_week(raw_data)
-    return df[df["Week"] == week]["Sold Quantity"].sum()
+    return _week_total(as_prepared_sales(raw_data), week)
 
 def get_product_units_sold(raw_data, product, week):
-    df = preprocess_week(raw_data)
-    mask = (df["Item Description"].str.lower() == product.lower()) & (df["Week"] == week)
-    return df[mask]["Sold Quantity"].sum()
+    sales = as_prepared_sales(raw_data)
+    totals = _within_week(sales, week, "Item Description")
+    return _total_for_labels(totals, sales.products.labels(product))
 
 def get_vendor_units_sold(raw_data, vendor):
-    return raw_data[raw_data["Vendor Name"].str.lower() == vendor.lower()]["Sold Quantity"].sum()
+    sales = as_prepared_sales(raw_data)
+    return _total_for_labels(sales.cube.rollup("Vendor Name"), sales.vendors.labels(vendor))
 
 def compare_weekly_units_sold(raw_data, week1, week2):
-    df = preprocess_week(raw_data)
-    units_1 = df[df["Week"] == week1]["Sold Quantity"].sum()
-    units_2 = df[df["Week"] == week2]["Sold Quantity"].sum()
-    return units_1, units_2
+    sales = as_prepared_sales(raw_data)
+    return _week_total(sales, week1), _week_total(sales, week2)
 
 def get_top_performing_product(raw_data):
-    df = raw_data.copy()
-    grouped = df.groupby("Item Description")["Sold Quantity"].sum()
+    grouped = as_prepared_sales(raw_data).cube.rollup("Item Description")
     if grouped.empty:
         return None, None
     return grouped.idxmax(), grouped.max()
 
 def get_worst_performing_product(raw_data):
-    df = raw_data.copy()
-    grouped = df.groupby("Item Description")["Sold Quantity"].sum()
+    grouped = as_prepared_sales(raw_data).cube.rollup("Item Description")
     if grouped.empty:
         return None, None
     return grouped.idxmin(), grouped.min()
 
 def get_top_vendor_by_units(raw_data, week):
-    df = preprocess_week(raw_data)
-    grouped = df[df["Week"] == week].groupby("Vendor Name")["Sold Quantity"].sum()
+    grouped = _within_week(as_prepared_sales(raw_data), week, "Vendor Name")
     if grouped.empty:
         return None, 0
     return grouped.idxmax(), grouped.max()
 
+def get_top_vendors_by_month(raw_data, month, year=None, n=5):
+    """Top n vendors by units in a calendar month; without a year, that month in every year."""
+    sales = as_prepared_sales(raw_data)
+    if year is None:
+        totals = sales.cube.within("Month", month, "Vendor Name")
+    else:
+        last_day = (pd.Timestamp(year, month, 1) + pd.offsets.MonthEnd(0)).date()
+        rows = sales.dates_between(date(year, month, 1), last_day)
+        totals = rows.groupby("Vendor Name", observed=True)["Sold Quantity"].sum()
+    return totals.sort_values(ascending=False).head(n)
+
 def get_top5_vendors_july(raw_data):
-    df = raw_data.copy()
-    df["Month"] = pd.to_datetime(df["Local Order Date"]).dt.month
-    july_df = df[df["Month"] == 7]
-    return july_df.groupby("Vendor Name")["Sold Quantity"].sum().sort_values(ascending=False).head(5)
+    return get_top_vendors_by_month(raw_data, 7, n=5)
+
+
+# ---------- Week Ranges & Trends ----------
+def _weekly_units(sales, product=None):
+    """Units per (ISO year, week) for every calendar week from the first to the last partition (gaps are 0)."""
+    keys = sales.partitions
+    if product is None:
+        totals = sales.cube.rollup("Year", "Week")
+    else:
+        by_product = sales.cube.rollup("Year", "Week", "Item Description")
+        labels = sales.products.labels(product)
+        totals = by_product[by_product.index.get_level_values(2).isin(labels)].groupby(level=[0, 1]).sum()
+    totals = {(int(y), int(w)): units for (y, w), units in totals.items()}
+    if keys:
+        mondays = pd.date_range(date.fromisocalendar(*keys[0], 1), date.fromisocalendar(*keys[-1], 1), freq="7D")
+        iso = mondays.isocalendar()
+        keys = list(zip(iso["year"].tolist(), iso["week"].tolist()))
+    index = pd.MultiIndex.from_tuples(keys, names=["Year", "Week"])
+    return pd.Series([totals.get(key, 0) for key in keys], index=index, dtype="float64", name="Sold Quantity")
+
+def _resolve_week(sales, week):
+    """An (ISO year, week) key: tuples as given, a week number as its most recent year, None as the latest week."""
+    if isinstance(week, tuple):
+        return int(week[0]), int(week[1])
+    return sales.latest_partition(week)
+
+def get_units_sold_between(raw_data, start, end):
+    """Units sold from start to end (dates, inclusive); only the weeks covering the range are read."""
+    return as_prepared_sales(raw_data).dates_between(start, end)["Sold Quantity"].sum()
+
+def get_rolling_units_sold(raw_data, n_weeks=4, week=None, product=None):
+    """Trailing n-week unit totals per (ISO year, week), up to and including week (default: all weeks)."""
+    sales = as_prepared_sales(raw_data)
+    weekly = _weekly_units(sales, product)
+    if week is not None:
+        end = _resolve_week(sales, week)
+        weekly = weekly[[key <= end for key in weekly.index]] if end is not None else weekly.iloc[0:0]
+    return weekly.rolling(n_weeks, min_periods=1).sum()
+
+def get_week_over_week_change(raw_data, week=None, product=None):
+    """(units in the week before, units in the week, fractional change or None); defaults to the latest week."""
+    sales = as_prepared_sales(raw_data)
+    key = _resolve_week(sales, week)
+    weekly = _weekly_units(sales, product)
+    if key is None or key not in weekly.index:
+        return 0, 0, None
+    position = weekly.index.get_loc(key)
+    units = weekly.iloc[position]
+    previous = weekly.iloc[position - 1] if position > 0 else 0
+    return previous, units, ((units - previous) / previous if previous else None)
 
 
 # ---------- COGS & Performance ----------
+# Per-week rankings come from tables built once per prepared sheet and metric (see WeekRanking).
 def get_top_products_by_cogs(organic, week, top_n=5):
-    return organic[organic["Week"] == week].sort_values("COGS", ascending=False).head(top_n)
+    return _organic(organic).ranked(week, "COGS", top_n)
 
 def get_highest_cogs_organic(organic, week):
-    df = organic[organic["Week"] == week]
-    if df.empty:
-        return None, None
-    idx = df["COGS"].idxmax()
-    return df.loc[idx, "PRODUCT NAME"], df.loc[idx, "COGS"]
+    return _organic(organic).top_row(week, "COGS") or (None, None)
+
+
+# ---------- Batched Product × Week Metrics ----------
+# metric -> (channel, aggregation, column) over the rows of one product in one week
+CHANNEL_METRICS = {
+    "org_units": ("organic", "sum", "Org Units sold"),
+    "media_units": ("media", "sum", "Media Units Sold"),
+    "org_share": ("organic", "mean", "Organic Share of Sales %"),
+    "media_share": ("media", "mean", "Media Share %"),
+    "org_daily_sv": ("organic", "mean", "Daily Organic SV"),
+    "media_daily_sv": ("media", "mean", "Daily MSV"),
+}
+# metric -> (metrics it needs, how to compute it from them)
+DERIVED_METRICS = {
+    "total_units": (["org_units", "media_units"], lambda f: f["org_units"] + f["media_units"]),
+    "daily_sv_diff": (["org_daily_sv", "media_daily_sv"], lambda f: f["org_daily_sv"] - f["media_daily_sv"]),
+}
+
+def get_product_week_metrics(organic, media, products=None, weeks=None, metrics=None):
+    """Organic/media metrics for every (product, week) pair, as one tidy frame.
+
+    weeks are week numbers (that week in every year) or (ISO year, week) tuples.
+    products and weeks default to everything in either sheet; metrics to all of
+    CHANNEL_METRICS and DERIVED_METRICS. Products are matched like the scalar
+    functions (case and punctuation insensitive). Summed metrics are 0 and
+    averaged ones NaN where a product has no rows in a week. Values come from
+    the joined organic–media panel, built once per pair of prepared sheets.
+    """
+    organic, media = _organic(organic), _media(media)
+    metrics = list(metrics or [*CHANNEL_METRICS, *DERIVED_METRICS])
+    unknown = [m for m in metrics if m not in CHANNEL_METRICS and m not in DERIVED_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    base = list(dict.fromkeys(
+        m for metric in metrics for m in (DERIVED_METRICS[metric][0] if metric in DERIVED_METRICS else [metric])
+    ))
+    if products is None:
+        products = organic.names.names + media.names.names
+    products = list(dict.fromkeys(products))
+    if weeks is not None:
+        weeks = list(dict.fromkeys(weeks))
+
+    columns = [CHANNEL_METRICS[m] for m in base]
+    frame = channel_panel(organic, media).lookup(products, weeks, columns)
+    frame.columns = base
+    for metric in metrics:
+        if metric in DERIVED_METRICS:
+            frame[metric] = DERIVED_METRICS[metric][1](frame)
+    return frame[metrics].reset_index()
+
+def _product_week(organic, media, product, week, metrics):
+    """The metrics of a single (product, week): direct lookups in the joined panel."""
+    panel = channel_panel(_organic(organic), _media(media))
+    values = {}
+    for metric in metrics:
+        for m in DERIVED_METRICS[metric][0] if metric in DERIVED_METRICS else [metric]:
+            if m not in values:
+                values[m] = panel.value(product, week, CHANNEL_METRICS[m])
+        if metric in DERIVED_METRICS:
+            values[metric] = DERIVED_METRICS[metric][1](values)
+    return values
 
 
 # ---------- Share % and Media vs Organic ----------
 def get_week_highest_organic_share(organic):
-    grouped = organic.groupby("Week")["Organic Share of Sales %"].mean()
+    grouped = _rows(organic).groupby("Week")["Organic Share of Sales %"].mean()
     if grouped.empty:
         return None, None
     return grouped.idxmax(), grouped.max()
 
 def get_lowest_organic_share_product(organic, week):
-    df = organic[organic["Week"] == week]
-    if df.empty:
-        return None, None
-    idx = df["Organic Share of Sales %"].idxmin()
-    return df.loc[idx, "PRODUCT NAME"], df.loc[idx, "Organic Share of Sales %"]
+    return _organic(organic).top_row(week, "Organic Share of Sales %", descending=False) or (None, None)
 
 def compare_media_organic_share(organic, media, product, week):
-    org_share = organic[(organic["PRODUCT NAME"].str.lower() == product.lower()) & (organic["Week"] == week)]["Organic Share of Sales %"].mean()
-    med_share = media[(media["Product Name"].str.lower() == product.lower()) & (media["Week"] == week)]["Media Share %"].mean()
-    return org_share, med_share
+    row = _product_week(organic, media, product, week, ["org_share", "media_share"])
+    return row["org_share"], row["media_share"]
 
 def get_organic_share_of_sales(organic, product, week):
-    df = organic[(organic["PRODUCT NAME"].str.lower() == product.lower()) & (organic["Week"] == week)]
+    df = _organic(organic).product_week(product, week)
     return df["Organic Share of Sales %"].mean()
 
 
 # ---------- Media vs Organic Units / SV ----------
 def compare_organic_vs_media_units(organic, media, product, week):
-    org_units = organic[(organic["PRODUCT NAME"].str.lower() == product.lower()) & (organic["Week"] == week)]["Org Units sold"].sum()
-    med_units = media[(media["Product Name"].str.lower() == product.lower()) & (media["Week"] == week)]["Media Units Sold"].sum()
-    return org_units, med_units
+    row = _product_week(organic, media, product, week, ["org_units", "media_units"])
+    return row["org_units"], row["media_units"]
 
 def get_diff_daily_sv_media_organic(organic, media, product, week):
-    org_sv = organic[(organic["PRODUCT NAME"].str.lower() == product.lower()) & (organic["Week"] == week)]["Daily Organic SV"].mean()
-    med_sv = media[(media["Product Name"].str.lower() == product.lower()) & (media["Week"] == week)]["Daily MSV"].mean()
-    return org_sv, med_sv, (org_sv - med_sv if pd.notna(org_sv) and pd.notna(med_sv) else None)
+    row = _product_week(organic, media, product, week, ["org_daily_sv", "media_daily_sv", "daily_sv_diff"])
+    diff = row["daily_sv_diff"]
+    return row["org_daily_sv"], row["media_daily_sv"], (diff if pd.notna(diff) else None)
 
 def get_total_media_organic_units(organic, media, product, week):
-    org_units = organic[(organic["PRODUCT NAME"].str.lower() == product.lower()) & (organic["Week"] == week)]["Org Units sold"].sum()
-    med_units = media[(media["Product Name"].str.lower() == product.lower()) & (media["Week"] == week)]["Media Units Sold"].sum()
-    return org_units + med_units
+    return _product_week(organic, media, product, week, ["total_units"])["total_units"]
 
 
 # ---------- Net Income ----------
 def get_weekly_ni_organic(organic, product):
-    df = organic[organic["PRODUCT NAME"].str.lower() == product.lower()]
+    df = _organic(organic).product(product)
     return df.groupby("Week")["Net Income Per SKU Organic (Excl. Tax)"].mean()
 
 def get_avg_ni_sku_organic(organic, week):
-    return organic[organic["Week"] == week]["Avg NI SKU Organic (Fixed)"].mean()
+    return _week_rows(organic, week)["Avg NI SKU Organic (Fixed)"].mean()
 
 def get_avg_ni_per_sku_media(media, week):
-    return media[media["Week"] == week]["NI per SKU"].mean()
+    return _week_rows(media, week)["NI per SKU"].mean()
 
 def get_avg_ni_per_sku_media_by_product(media, product):
-    return media[media["Product Name"].str.lower().str.contains(product.lower())]["NI per SKU"].mean()
+    return _media(media).product_containing(product)["NI per SKU"].mean()
 
 def get_negative_ni_per_sku_products(media, week):
-    return media[(media["Week"] == week) & (media["NI per SKU"] < 0)]["Product Name"].unique().tolist()
+    df = _media(media).rows_beyond(week, "NI per SKU", 0, descending=False)
+    return df["Product Name"].unique().tolist()
 
 def get_positive_ni_per_sku_products(media, week):
-    return media[(media["Week"] == week) & (media["NI per SKU"] > 0)]["Product Name"].unique().tolist()
+    df = _media(media).rows_beyond(week, "NI per SKU", 0)
+    return df["Product Name"].unique().tolist()
 
 def get_top_ni_product_in_media(media, week):
-    df = media[media["Week"] == week]
-    if df.empty:
-        return None, 0
-    idx = df["Total Daily NI Media"].idxmax()
-    return df.loc[idx, "Product Name"], df.loc[idx, "Total Daily NI Media"]
+    return _media(media).top_row(week, "Total Daily NI Media") or (None, 0)
 
 def get_total_ni_media(media, week):
-    return media[media["Week"] == week]["Total Daily NI Media"].sum()
+    return _week_rows(media, week)["Total Daily NI Media"].sum()
 
 
 # ---------- SV Metrics ----------
 def get_week_with_highest_daily_msv(media):
+    media = _rows(media)
     idx = media["Daily MSV"].idxmax()
     return media.loc[idx, "Week"], media.loc[idx, "Daily MSV"]
 
 def get_avg_daily_osv(change, week):
-    return change[change["Week"] == week]["Avg Daily OSV"].mean()
+    return _week_rows(change, week)["Avg Daily OSV"].mean()
 
 def get_total_organic_sv(organic, week):
-    return organic[organic["Week"] == week]["Daily Organic SV"].sum()
+    return _week_rows(organic, week)["Daily Organic SV"].sum()
 
 def get_highest_daily_org_sv(organic, week):
-    df = organic[organic["Week"] == week]
-    if df.empty:
-        return None, 0
-    idx = df["Daily Organic SV"].idxmax()
-    return df.loc[idx, "PRODUCT NAME"], df.loc[idx, "Daily Organic SV"]
+    return _organic(organic).top_row(week, "Daily Organic SV") or (None, 0)
 
 def get_week_with_lowest_avg_overall_sv(change):
     idx = change["Avg Overall Daily SV"].idxmin()
@@ -163,38 +298,37 @@ def get_week_with_lowest_avg_overall_sv(change):
 
 # ---------- Product Rankings ----------
 def get_highest_units_sold_product(raw_data, week):
-    df = preprocess_week(raw_data)
-    grouped = df[df["Week"] == week].groupby("Item Description")["Sold Quantity"].sum()
+    grouped = _within_week(as_prepared_sales(raw_data), week, "Item Description")
     if grouped.empty:
         return None, 0
     return grouped.idxmax(), grouped.max()
 
 def get_top_products_by_media_units(media, week, top_n=3):
-    df = media[media["Week"] == week]
-    grouped = df.groupby("Product Name")["Media Units Sold"].sum()
-    return grouped.sort_values(ascending=False).head(top_n)
+    return _media(media).ranked_totals(week, "Media Units Sold", top_n)
 
 def get_top_n_performing_products(raw_data, n=5, week=None, metric="Sold Quantity"):
-    df = raw_data.copy()
-    if week is not None:
-        df["Week"] = pd.to_datetime(df["Local Order Date"]).dt.isocalendar().week
-        df = df[df["Week"] == week]
-    grouped = df.groupby("Item Description")[metric].sum().sort_values(ascending=False).head(n)
+    sales = as_prepared_sales(raw_data)
+    if metric == "Sold Quantity":
+        totals = sales.cube.rollup("Item Description") if week is None else _within_week(sales, week, "Item Description")
+    else:
+        df = sales.week(week) if week is not None else sales.frame
+        totals = df.groupby("Item Description", observed=True)[metric].sum()
+    grouped = totals.sort_values(ascending=False).head(n)
     return grouped  # Series: product name -> metric value
 
 
 
 def get_avg_overall_daily_sv(change, week):
     """Get the average overall daily SV for a specific week"""
-    df = change[change["Week"] == week]
+    df = _week_rows(change, week)
     if df.empty:
         return None
     return df["Avg Overall Daily SV"].mean()
 
 def get_change_in_media_share(change, week1, week2):
     """Get the change in media share percentage between two weeks"""
-    df1 = change[change["Week"] == week1]
-    df2 = change[change["Week"] == week2]
+    df1 = _week_rows(change, week1)
+    df2 = _week_rows(change, week2)
     
     if df1.empty or df2.empty:
         return None
@@ -1,72 +1,185 @@
 import pandas as pd
-import re
-import streamlit as st
-from langchain.chains import LLMChain
-from langchain_openai import ChatOpenAI
-from prompt import prompt_template
+import time
+from prompt import CONTEXT_COLUMNS, FUNCTIONS_CONTEXT, prompt_template, sql_prompt_template
+from dataset import load_dataset
+from intents import answer_locally
+from answer_cache import cache_key, get_answer_cache
+from llm_client import MODEL, get_llm_client
+from metrics import Trace, count_tokens
+from retrieval import relevant_context
+from sql_engine import SQL_ROW_LIMIT, SQLError, clean_query, describe_tables, format_result, sql_engine
+from request_pool import get_request_pool
 from business_logic import *  # All business logic functions are imported here
 
 def main_chatbot(question, excel_path):
+    """Answer a question in one piece (the streamed answer, joined)."""
+    return "".join(main_chatbot_stream(question, excel_path))
+
+def main_chatbot_stream(question, excel_path):
+    """Answer a question as a stream of text chunks; LLM answers arrive token by token."""
+    # ✅ Every request leaves a trace of its stage timings and token counts
+    trace = Trace(question)
+    try:
+        for chunk in _answer_stream(question, excel_path, trace):
+            trace.mark("first_chunk")
+            yield chunk
+    finally:
+        trace.finish()
+
+def _answer_stream(question, excel_path, trace):
     # Handle basic greetings
     if question.strip().lower() in ["hi", "hello", "hey", "salaam", "salam", "hi there"]:
-        return "👋 Hello! I'm your KRISPR Digital Analyst. How can I assist you today?"
+        trace.set(route="greeting")
+        yield "👋 Hello! I'm your KRISPR Digital Analyst. How can I assist you today?"
+        return
 
     try:
-        # ✅ Load and prepare data
-        sheets = pd.read_excel(excel_path, sheet_name=None)
-        raw_data = sheets.get("Raw Data - Date Wise")
-        organic = sheets.get("Organic")
-        media = sheets.get("Media")
-        change = sheets.get("Overall Avg & Change")
+        # ✅ Load and prepare data (parsed once per file version, shared by all sessions)
+        with trace.stage("load"):
+            dataset = load_dataset(excel_path)
+        trace.set(dataset_version=dataset.version)
+        # ✅ Sheets are read lazily: the checks below only look at headers, and each
+        # answer path reads just the sheets (and columns) it touches
+        raw_columns = dataset.columns("Raw Data - Date Wise")
 
         # Check if data is available
-        if raw_data is None:
-            return "❌ Unable to load the required data. Please check your Excel file."
+        if raw_columns is None:
+            trace.set(route="invalid")
+            yield "❌ Unable to load the required data. Please check your Excel file."
+            return
 
-        # ✅ Ensure datetime column is parsed and handle missing columns
-        try:
-            raw_data["Local Order Date"] = pd.to_datetime(raw_data["Local Order Date"], errors="coerce")
-        except KeyError:
-            return "❌ The Excel file is missing the 'Local Order Date' column. Please check your data format."
+        # ✅ Dates are parsed at load time; just make sure the column exists
+        if "Local Order Date" not in raw_columns:
+            trace.set(route="invalid")
+            yield "❌ The Excel file is missing the 'Local Order Date' column. Please check your data format."
+            return
 
         # Validate required columns exist
         required_columns = ["Item Description", "Vendor Name", "Sold Quantity"]
-        missing_columns = [col for col in required_columns if col not in raw_data.columns]
+        missing_columns = [col for col in required_columns if col not in raw_columns]
         if missing_columns:
-            return f"❌ Missing required columns in your data: {', '.join(missing_columns)}. Please check your Excel file format."
-
-        # Create a comprehensive data context for the LLM
-        data_context = create_data_context(raw_data, organic, media, change)
-        
-        # Add business logic functions context
-        functions_context = create_functions_context()
-        
-        # Combine contexts
-        full_context = data_context + "\n\n" + functions_context
-        
-        # Use LLM for all business questions
-        llm = ChatOpenAI(
-            model="gpt-3.5-turbo-1106",
-            temperature=0.1,  # Slightly higher for more natural responses
-            api_key=st.secrets["OPENAI_API_KEY"]
-        )
+            trace.set(route="invalid")
+            yield f"❌ Missing required columns in your data: {', '.join(missing_columns)}. Please check your Excel file format."
+            return
+
+        # ✅ Recognised question shapes are answered locally, without an LLM round trip
+        with trace.stage("local"):
+            local_answer = answer_locally(question, dataset)
+        trace.set(sheets_loaded=sorted(dataset.loaded_sheets()))
+        if local_answer is not None:
+            trace.set(route="local")
+            yield local_answer
+            return
 
-        chain = LLMChain(llm=llm, prompt=prompt_template)
-        response = chain.run({"data": full_context, "question": question})
-        
-        return response
+        # ✅ Reuse an earlier LLM answer for the same question on the same workbook
+        answer_cache = get_answer_cache()
+        with trace.stage("answer_cache"):
+            cached_answer = answer_cache.get(question, dataset.version)
+        if cached_answer is not None:
+            trace.set(route="cached")
+            yield cached_answer
+            return
+
+        # ✅ Generate on the shared, bounded pool; sessions asking the same question
+        # on the same workbook at the same time share one LLM call
+        key = cache_key(question, dataset.version)
+        trace.set(route="coalesced")  # becomes "llm" if this request runs the generation itself
+        submitted = time.monotonic()
+        yield from get_request_pool().stream(
+            key, lambda: generate_answer(question, dataset, answer_cache, trace, submitted)
+        )
 
     except Exception as e:
-        # Provide more helpful error messages
-        error_msg = str(e)
-        if "Item Description" in error_msg:
-            return "❌ There's an issue with the product data in your Excel file. Please check that the 'Item Description' column exists and contains valid product names."
-        elif "Vendor Name" in error_msg:
-            return "❌ There's an issue with the vendor data in your Excel file. Please check that the 'Vendor Name' column exists and contains valid vendor names."
-        elif "Sold Quantity" in error_msg:
-            return "❌ There's an issue with the sales data in your Excel file. Please check that the 'Sold Quantity' column exists and contains valid numbers."
-        else:
-            return f"⚠️ Error processing your request: {error_msg}"
+        trace.set(route="error", error=str(e))
+        yield _error_message(e)
+
+def generate_answer(question, dataset, answer_cache, trace=None, submitted=None, limiter=None):
+    """Build the prompt and stream the LLM answer, caching it once complete.
+
+    limiter.acquire(), when given, is called before each LLM request (query planning, if any, and the answer).
+    """
+    trace = trace or Trace(question)
+    trace.set(route="llm")
+    if submitted is not None:
+        trace.add("queue", time.monotonic() - submitted)
+
+    # ✅ Functions + data context, built once per workbook version and reused
+    with trace.stage("context"):
+        full_context = get_prompt_context(dataset)
+
+    # ✅ Ground the answer in the rows/columns relevant to this question, within a token budget
+    with trace.stage("retrieval"):
+        relevant = relevant_context(question, dataset)
+    if relevant:
+        full_context += "\n\n📌 **Relevant Data for this Question:**\n" + relevant
+
+    # ✅ Nothing retrieved: let the LLM query the embedded SQL engine for the figures it needs.
+    # That is an extra LLM round trip before the first token, so questions with retrieved rows skip it
+    if relevant:
+        trace.set(sql_skipped=True)
+    else:
+        with trace.stage("sql"):
+            query_result = query_for_question(question, dataset, trace, limiter)
+        if query_result:
+            full_context += "\n\n🧮 **Query Result for this Question:**\n" + query_result
+
+    # ✅ Use the shared LLM client and stream tokens as they are generated
+    prompt = prompt_template.format(data=full_context, question=question)
+    trace.set(prompt_tokens=count_tokens(prompt, MODEL) + trace.record.get("sql_prompt_tokens", 0))
+    chunks = []
+    if limiter is not None:
+        limiter.acquire()
+    started = time.monotonic()
+    for token in get_llm_client().stream(prompt):
+        if not chunks:
+            trace.add("llm_first_token", time.monotonic() - started)
+        chunks.append(token)
+        yield token
+    trace.add("llm", time.monotonic() - started)
+    answer = "".join(chunks)
+    trace.set(completion_tokens=count_tokens(answer, MODEL) + trace.record.get("sql_completion_tokens", 0))
+    answer_cache.put(question, dataset.version, answer)
+
+def query_for_question(question, dataset, trace=None, limiter=None):
+    """Have the LLM write one read-only query, run it locally and return the result as text.
+
+    Returns None when SQL is disabled, the LLM declines, or the query is rejected or fails.
+    """
+    engine = sql_engine(dataset)
+    if engine is None:
+        return None
+    prompt = sql_prompt_template.format(
+        dialect=engine.dialect, tables=describe_tables(engine), row_limit=SQL_ROW_LIMIT, question=question,
+    )
+    if limiter is not None:
+        limiter.acquire()
+    reply = get_llm_client().complete(prompt)
+    if trace is not None:
+        trace.set(sql_prompt_tokens=count_tokens(prompt, MODEL), sql_completion_tokens=count_tokens(reply, MODEL))
+    if reply.strip().upper().startswith("NONE"):
+        return None
+    try:
+        sql = clean_query(reply)
+        frame, truncated = engine.query(sql)
+    except SQLError as e:
+        if trace is not None:
+            trace.set(sql_error=str(e))
+        return None
+    if trace is not None:
+        trace.set(sql_rows=len(frame))
+    return format_result(sql, frame, truncated)
+
+def _error_message(e):
+    # Provide more helpful error messages
+    error_msg = str(e)
+    if "Item Description" in error_msg:
+        return "❌ There's an issue with the product data in your Excel file. Please check that the 'Item Description' column exists and contains valid product names."
+    elif "Vendor Name" in error_msg:
+        return "❌ There's an issue with the vendor data in your Excel file. Please check that the 'Vendor Name' column exists and contains valid vendor names."
+    elif "Sold Quantity" in error_msg:
+        return "❌ There's an issue with the sales data in your Excel file. Please check that the 'Sold Quantity' column exists and contains valid numbers."
+    else:
+        return f"⚠️ Error processing your request: {error_msg}"
 
 def create_data_context(raw_data, organic, media, change):
     """Create a comprehensive data context for the LLM"""
@@ -161,38 +274,21 @@ def create_data_context(raw_data, organic, media, change):
     
     return context
 
+def get_prompt_context(dataset):
+    """The combined prompt context for a dataset version, computed on first use.
+
+    The constant functions section comes first and the version-specific data
+    summary second, so the prompt prefix stays byte-identical across questions
+    and can be served from the provider's prompt cache.
+    """
+    def build(ds):
+        data_context = create_data_context(*(
+            ds.sheet(sheet, columns) for sheet, columns in CONTEXT_COLUMNS.items()
+        ))
+        return FUNCTIONS_CONTEXT + "\n\n" + data_context
+
+    return dataset.derived("prompt_context", build)
+
 def create_functions_context():
     """Create context about available business logic functions"""
-    
-    context = """🔧 **Available Analysis Functions:**
-
-**Sales & Units Analysis:**
-- get_total_units_sold(raw_data, week) - Total units sold in a week
-- get_product_units_sold(raw_data, product, week) - Units sold for specific product
-- get_highest_units_sold_product(raw_data, week) - Best selling product in a week
-- get_top_vendor_by_units(raw_data, week) - Top vendor by units sold
-- compare_weekly_units_sold(raw_data, week1, week2) - Compare two weeks
-
-**Performance Analysis:**
-- get_top_performing_product(raw_data) - Overall best product
-- get_top_n_performing_products(raw_data, n=5, week=None) - Top N products
-- get_top5_vendors_july(raw_data) - Top 5 vendors in July
-
-**Organic vs Media Analysis:**
-- compare_organic_vs_media_units(organic, media, product, week) - Compare channels
-- get_diff_daily_sv_media_organic(organic, media, product, week) - SV difference
-- get_total_media_organic_units(organic, media, product, week) - Combined units
-
-**Financial Analysis:**
-- get_total_ni_media(media, week) - Total net income in media
-- get_negative_ni_per_sku_products(media, week) - Products with negative NI
-- get_positive_ni_per_sku_products(media, week) - Products with positive NI
-
-**Share & Metrics Analysis:**
-- get_week_with_highest_daily_msv(media) - Week with highest MSV
-- get_avg_daily_osv(change, week) - Average daily OSV
-- get_top_products_by_media_units(media, week, top_n=3) - Top media products
-
-**Note:** Use these functions when you need to perform specific calculations. Always provide accurate results based on the actual data."""
-    
-    return context
+    return FUNCTIONS_CONTEXT
@@ -0,0 +1,453 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from schema import normalize_frame, normalize_sheets, object_memory, sheet_memory
+from snapshot import load_snapshot_sheet, snapshot_columns, snapshot_sheet_names, snapshots_available, write_snapshot
+
+# ---------- Process-wide Workbook Cache ----------
+# Streamlit imports this module once per server process, so everything kept at
+# module level here is shared by all chat sessions. Several workbooks (brands,
+# regions, historical snapshots) can be served at once; together they stay under
+# one memory budget, see SegmentedLRU.
+
+MEMORY_BUDGET = int(float(os.environ.get("KRISPR_MEMORY_BUDGET_MB", 1024)) * 1e6)
+PROTECTED_SHARE = float(os.environ.get("KRISPR_PROTECTED_SHARE", 0.8))   # of the budget, for datasets used twice or more
+
+
+class Dataset:
+    """One parsed version of a workbook plus everything derived from it.
+
+    With a source, sheets are read on first access, and only the columns asked
+    for, then kept; without one, sheets holds the fully parsed workbook.
+    """
+
+    def __init__(self, path, version, sheets=None, reuse=None, source=None):
+        self.path = path
+        self.version = version
+        self._sheets = dict(sheets or {})
+        self._partial = {}   # sheet -> columns still unread, for sheets read with a column subset
+        self._source = source
+        self._sheets_lock = threading.RLock()
+        # State carried over from the previous version, e.g. aggregates of unchanged weeks
+        self.reuse = dict(reuse or {})
+        self._derived = {}
+        self._derived_lock = threading.RLock()
+        self._building = threading.local()   # .depth: derived builds in progress on this thread
+        self._memory = None   # (loaded state, bytes) of the last estimate
+        self._sheet_bytes = {}   # sheet -> (frame, bytes) as last measured
+
+    @property
+    def sheet_names(self):
+        return self._source.sheet_names() if self._source is not None else list(self._sheets)
+
+    @property
+    def sheets(self):
+        """Every sheet with all its columns (reads whatever is not loaded yet)."""
+        return {name: self.sheet(name) for name in self.sheet_names}
+
+    def loaded_sheets(self):
+        """The sheets read so far, without reading more."""
+        with self._sheets_lock:
+            return dict(self._sheets)
+
+    def has_sheet(self, name):
+        return name in self.sheet_names
+
+    def columns(self, name):
+        """Column names of a sheet without reading its rows (None for a missing sheet)."""
+        with self._sheets_lock:
+            if name in self._sheets and name not in self._partial:
+                return list(self._sheets[name].columns)
+        if self._source is None or not self.has_sheet(name):
+            return None
+        return self._source.columns(name)
+
+    def sheet(self, name, columns=None):
+        """A sheet with at least the given columns (default: all), read on first access."""
+        frame, read = self._load_sheet(name, columns)
+        if read and not getattr(self._building, "depth", 0):
+            # Lazy reads grow a cached dataset, so the memory budget is checked again
+            enforce_budget(keep=self.path)
+        return frame
+
+    def _load_sheet(self, name, columns):
+        """(sheet, whether anything was read from the source)."""
+        with self._sheets_lock:
+            frame = self._sheets.get(name)
+            missing = self._partial.get(name) if frame is not None else None
+            if self._source is None or (frame is not None and not missing):
+                return frame, False
+            if not self.has_sheet(name):
+                return None, False
+            available = self._source.columns(name)
+            wanted = available if columns is None else [c for c in available if c in set(columns)]
+            if frame is not None:
+                wanted = [c for c in wanted if c in missing]
+                if not wanted:
+                    return frame, False
+            part = self._source.read(name, None if frame is None and columns is None else wanted)
+            if frame is not None:
+                part = pd.concat([frame, part], axis=1)
+                part = part[[c for c in available if c in part.columns]]
+            unread = [c for c in available if c not in part.columns]
+            if unread:
+                self._partial[name] = set(unread)
+            else:
+                self._partial.pop(name, None)
+            self._sheets[name] = part
+            return part, True
+
+    def derived(self, key, builder):
+        """Return builder(self), computing it only once for this version."""
+        with self._derived_lock:
+            if key in self._derived:
+                return self._derived[key]
+            # Nested reads and builds leave the budget check to the outermost one
+            depth = self._building.depth = getattr(self._building, "depth", 0) + 1
+            try:
+                value = self._derived[key] = builder(self)
+            finally:
+                self._building.depth = depth - 1
+        if depth == 1:
+            enforce_budget(keep=self.path)
+        return value
+
+    def memory_bytes(self):
+        """Approximate bytes held by the loaded sheets and derived objects, re-measured only after either changed."""
+        # Plain dict copies are atomic, so this never waits for a sheet read or a derived build in progress
+        sheets, derived = dict(self._sheets), dict(self._derived)
+        state = (tuple((name, id(df)) for name, df in sheets.items()), tuple(derived))
+        memory = self._memory
+        if memory is None or memory[0] != state:
+            seen = {id(df) for df in sheets.values()}
+            # Sheets already measured keep their size: only a new or widened sheet is scanned
+            sizes = self._sheet_bytes
+            self._sheet_bytes = sizes = {
+                name: sizes[name] if name in sizes and sizes[name][0] is df else (df, sheet_memory(df))
+                for name, df in sheets.items()
+            }
+            total = sum(size for _, size in sizes.values())
+            total += sum(object_memory(value, seen=seen) for value in derived.values())
+            self._memory = memory = (state, total)
+        return memory[1]
+
+    @property
+    def measured_bytes(self):
+        """The last memory_bytes() estimate, without measuring again (0 before the first)."""
+        memory = self._memory
+        return memory[1] if memory is not None else 0
+
+    def reusable(self):
+        """What derived objects offer the next version of this workbook (see carry_over)."""
+        with self._derived_lock:
+            derived = list(self._derived.items())
+        offers = {}
+        for key, value in derived:
+            offer = value.reusable() if hasattr(value, "reusable") else None
+            if offer is not None:
+                offers[key] = offer
+        return offers
+
+
+class SegmentedLRU:
+    """Datasets by path in two LRU segments that together stay under a memory budget.
+
+    A dataset enters the probation segment and moves to the protected one when it
+    is used again. Protected datasets may take up to protected_share of the budget;
+    beyond that the least recently used one drops back to probation. Eviction
+    starts with the least recently used probation entry, so a workbook opened once
+    (a rarely asked-about brand, an old snapshot) leaves before any workbook in
+    regular use. An evicted workbook reopens from its snapshot, without reparsing.
+
+    Sizes are each dataset's last measured estimate (Dataset.measured_bytes), so
+    reordering under the cache lock never measures; enforce_budget measures first.
+    """
+
+    def __init__(self, budget=MEMORY_BUDGET, protected_share=PROTECTED_SHARE):
+        self.budget = budget
+        self.protected_share = protected_share
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+
+    def __len__(self):
+        return len(self._probation) + len(self._protected)
+
+    def peek(self, path):
+        """The dataset for path without counting a use, or None."""
+        dataset = self._protected.get(path)
+        return dataset if dataset is not None else self._probation.get(path)
+
+    def touch(self, path):
+        """Count a use of path's dataset: promote it from probation or refresh its protected position."""
+        if path in self._protected:
+            self._protected.move_to_end(path)
+        elif path in self._probation:
+            self._protected[path] = self._probation.pop(path)
+            self._demote()
+
+    def put(self, path, dataset):
+        """Add or replace path's dataset; a replacement keeps its segment."""
+        segment = self._protected if path in self._protected else self._probation
+        segment[path] = dataset
+        segment.move_to_end(path)
+
+    def pop(self, path):
+        dataset = self._protected.pop(path, None)
+        return dataset if dataset is not None else self._probation.pop(path, None)
+
+    def segment(self, path):
+        return "protected" if path in self._protected else "probation" if path in self._probation else None
+
+    def entries(self):
+        """[(path, dataset)] from the first to the last eviction candidate."""
+        return list(self._probation.items()) + list(self._protected.items())
+
+    def _demote(self):
+        limit = self.budget * self.protected_share
+        while len(self._protected) > 1 and sum(d.measured_bytes for d in self._protected.values()) > limit:
+            path, dataset = self._protected.popitem(last=False)
+            self._probation[path] = dataset
+
+    def evict(self, keep=None):
+        """Drop datasets, coldest first, until the rest fits the budget; never keep. Returns the dropped paths."""
+        self._demote()
+        sizes = {path: dataset.measured_bytes for path, dataset in self.entries()}
+        total = sum(sizes.values())
+        evicted = []
+        for path in list(sizes):
+            if total <= self.budget:
+                break
+            if path != keep:
+                self.pop(path)
+                total -= sizes[path]
+                evicted.append(path)
+        return evicted
+
+
+_lock = threading.Lock()
+_file_versions = {}   # abs path -> (mtime_ns, size, version)
+_datasets = SegmentedLRU()   # abs path -> Dataset
+_load_locks = {}      # abs path -> Lock held while that path is being parsed
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+
+def _hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def file_version(path):
+    """Content hash of the file, recomputed only when its mtime or size changes."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    with _lock:
+        known = _file_versions.get(path)
+    if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+        return known[2]
+    version = _hash_file(path)
+    with _lock:
+        _file_versions[path] = (stat.st_mtime_ns, stat.st_size, version)
+    return version
+
+
+def _clean_header(name):
+    # Stray spaces in headers (e.g. "Item Description ") break column lookups
+    return name.strip() if isinstance(name, str) else name
+
+
+def _clean_sheet(name, df):
+    df.columns = [_clean_header(c) for c in df.columns]
+    if name == "Raw Data - Date Wise" and "Local Order Date" in df.columns:
+        df["Local Order Date"] = pd.to_datetime(df["Local Order Date"], errors="coerce")
+    return df
+
+
+def read_workbook(path):
+    """Parse every sheet of the workbook and normalise headers, the sales date column and dtypes."""
+    sheets = pd.read_excel(path, sheet_name=None)
+    for name, df in sheets.items():
+        _clean_sheet(name, df)
+    return normalize_sheets(sheets)[0]
+
+
+def read_sheet(path, name, columns=None):
+    """Parse one sheet of the workbook, only the given (cleaned) columns when columns is set."""
+    usecols = None if columns is None else (lambda header: _clean_header(header) in set(columns))
+    return normalize_frame(_clean_sheet(name, pd.read_excel(path, sheet_name=name, usecols=usecols)))
+
+
+class _SnapshotSource:
+    """Reads single sheets and column subsets from a version's memory-mapped snapshot."""
+
+    def __init__(self, path, version, names):
+        self.path, self.version, self._names = path, version, names
+        self._columns = {}
+
+    def sheet_names(self):
+        return self._names
+
+    def columns(self, name):
+        if name not in self._columns:
+            self._columns[name] = snapshot_columns(self.path, self.version, name)
+        return self._columns[name]
+
+    def read(self, name, columns=None):
+        # Snapshots written before dtypes were normalized still hold the wide types
+        return normalize_frame(load_snapshot_sheet(self.path, self.version, name, columns))
+
+
+class _WorkbookSource:
+    """Parses single sheets and column subsets straight from the xlsx (when snapshots are unavailable)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._names = None
+        self._columns = {}
+
+    def sheet_names(self):
+        if self._names is None:
+            with pd.ExcelFile(self.path) as book:
+                self._names = list(book.sheet_names)
+        return self._names
+
+    def columns(self, name):
+        if name not in self._columns:
+            header = pd.read_excel(self.path, sheet_name=name, nrows=0)
+            self._columns[name] = [_clean_header(c) for c in header.columns]
+        return self._columns[name]
+
+    def read(self, name, columns=None):
+        return read_sheet(self.path, name, columns)
+
+
+def _open_dataset(path, version, reuse=None):
+    """A Dataset reading sheets lazily from the snapshot, or sheet by sheet from the xlsx when
+    snapshots are unavailable. A version without a snapshot is parsed whole and snapshotted once."""
+    names = snapshot_sheet_names(path, version)
+    if names is not None:
+        return Dataset(path, version, reuse=reuse, source=_SnapshotSource(path, version, names))
+    if not snapshots_available():
+        return Dataset(path, version, reuse=reuse, source=_WorkbookSource(path))
+    sheets = read_workbook(path)
+    write_snapshot(path, version, sheets)
+    return Dataset(path, version, sheets, reuse=reuse)
+
+
+def load_dataset(path):
+    """Return the cached Dataset for the current contents of path, parsing it on a miss."""
+    path = os.path.abspath(path)
+    version = file_version(path)
+
+    with _lock:
+        dataset = _datasets.peek(path)
+        if dataset is not None and dataset.version == version:
+            _stats["hits"] += 1
+            _datasets.touch(path)
+            return dataset
+        load_lock = _load_locks.setdefault(path, threading.Lock())
+
+    # Only one session parses a given file; the others wait and then hit the cache.
+    with load_lock:
+        with _lock:
+            dataset = _datasets.peek(path)
+            if dataset is not None and dataset.version == version:
+                _stats["hits"] += 1
+                _datasets.touch(path)
+                return dataset
+            _stats["misses"] += 1
+
+        with _lock:
+            previous = _datasets.peek(path)
+        reuse = previous.reusable() if previous is not None else None
+        dataset = _open_dataset(path, version, reuse=reuse)
+        with _lock:
+            _datasets.put(path, dataset)
+        enforce_budget(keep=path)
+        return dataset
+
+
+def enforce_budget(keep=None):
+    """Evict cold datasets until the cached ones fit MEMORY_BUDGET (never keep); returns the evicted paths.
+
+    Runs whenever a dataset is opened or replaced and after a lazy sheet read or
+    derived build. Datasets grow as sheets and indexes are built lazily, so their
+    size is re-measured each time.
+    """
+    keep = os.path.abspath(keep) if keep else None
+    with _lock:
+        entries = [dataset for _, dataset in _datasets.entries()]
+    # Measure outside the lock; evict() below only reads the stored estimates
+    for dataset in entries:
+        dataset.memory_bytes()
+    with _lock:
+        evicted = _datasets.evict(keep=keep)
+        _stats["evictions"] += len(evicted)
+    return evicted
+
+
+def cached_dataset(path):
+    """The Dataset currently served for path, without checking the file, or None."""
+    with _lock:
+        return _datasets.peek(os.path.abspath(path))
+
+
+def replace_workbook(path, staging_path, dataset):
+    """Atomically move staging_path over path and serve the already-loaded dataset for it.
+
+    The dataset must have been built from staging_path, so its version (a content
+    hash) is also the version of path after the rename.
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        load_lock = _load_locks.setdefault(path, threading.Lock())
+    with load_lock:
+        os.replace(staging_path, path)
+        stat = os.stat(path)
+        with _lock:
+            _file_versions.pop(os.path.abspath(staging_path), None)
+            _file_versions[path] = (stat.st_mtime_ns, stat.st_size, dataset.version)
+            dataset.path = path
+            if _datasets.peek(path) is not None:
+                _stats["invalidations"] += 1
+            _datasets.put(path, dataset)
+    enforce_budget(keep=path)
+
+
+def invalidate_dataset(path):
+    """Drop the cached data for path, e.g. after the Admin Panel replaced the file."""
+    path = os.path.abspath(path)
+    with _lock:
+        _file_versions.pop(path, None)
+        if _datasets.pop(path) is not None:
+            _stats["invalidations"] += 1
+
+
+def cached_datasets():
+    """[{"path", "version", "segment", "bytes"}] for every cached dataset, coldest first."""
+    with _lock:
+        entries = [(path, dataset, _datasets.segment(path)) for path, dataset in _datasets.entries()]
+    return [
+        {"path": path, "version": dataset.version, "segment": segment, "bytes": dataset.memory_bytes()}
+        for path, dataset, segment in entries
+    ]
+
+
+def cache_stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        entries = [dataset for _, dataset in _datasets.entries()]
+        stats = {
+            **_stats,
+            "entries": len(entries),
+            "budget_bytes": _datasets.budget,
+            "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+        }
+    stats["bytes"] = sum(dataset.memory_bytes() for dataset in entries)
+    return stats
@@ -0,0 +1,477 @@
+import re
+
+import pandas as pd
+
+from business_logic import *  # All business logic functions are imported here
+from name_index import normalize_name
+from prepared_data import prepared_sales, prepared_sheet, week_rows
+
+# ---------- Local Fast Path ----------
+# Common question shapes are mapped onto business_logic functions and answered
+# directly from the cached dataset. Anything unrecognised returns None and goes
+# to the LLM as before.
+
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+         ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+         ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"), ("december", "dec")],
+        start=1,
+    )
+    for name in names
+}
+MONTH_NAMES = [None, "January", "February", "March", "April", "May", "June", "July", "August", "September",
+               "October", "November", "December"]
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+# Words that describe the question rather than name a product or vendor
+STOPWORDS = set("""
+a an and any are as at average avg be best between by can compare comparison daily did do does
+for from give had has have highest how i in is it largest last least list lowest many me most much
+my number of on or organic our over per performing please product products quantity sales sell
+sold selling show tell that the their there these this to top total unit units us vendor vendors
+versus vs was we week weeks what when where which who with worst you your media share sv msv osv
+net income ni sku cogs positive negative rolling trailing past previous change growth
+""".split()) | set(MONTHS) | set(NUMBER_WORDS)
+
+_WEEK_START = re.compile(r"\bw(?:ee)?ks?\s*#?\s*(?=\d)")
+_NUMBER = re.compile(r"(\btop\s*)?\b(\d{1,3})\b")
+_YEAR = re.compile(r"\b(20\d{2})\b")
+_LAST_N_WEEKS = re.compile(r"\b(?:last|past|rolling|trailing)\s*(\d+|" + "|".join(NUMBER_WORDS) + r")[\s-]*weeks?\b")
+_TOP_N = re.compile(r"\btop\s*(\d+|" + "|".join(NUMBER_WORDS) + r")\b")
+
+
+class Question:
+    """A user question with lazily extracted slots (weeks, month, top-n, names)."""
+
+    def __init__(self, text, dataset):
+        self.text = text
+        self.norm = " ".join(text.lower().split())
+        self.dataset = dataset
+        self.words = [w for w in normalize_name(text).split() if w not in STOPWORDS and not w.isdigit()]
+
+    def has(self, pattern):
+        return re.search(pattern, self.norm) is not None
+
+    @property
+    def week_numbers(self):
+        """Numbers mentioned after the first "week", ignoring "top N" counts, valid weeks or not."""
+        start = _WEEK_START.search(self.norm)
+        if not start:
+            return []
+        numbers = []
+        for top, number in _NUMBER.findall(self.norm[start.start():]):
+            if not top and int(number) not in numbers:
+                numbers.append(int(number))
+        return numbers
+
+    @property
+    def weeks(self):
+        return [n for n in self.week_numbers if 1 <= n <= 53]
+
+    @property
+    def invalid_weeks(self):
+        """Week numbers outside ISO weeks 1-53; the question must not be widened to all weeks."""
+        return [n for n in self.week_numbers if not 1 <= n <= 53]
+
+    @property
+    def week(self):
+        return self.weeks[0] if len(self.weeks) == 1 else None
+
+    @property
+    def month(self):
+        for word in self.norm.replace("?", " ").split():
+            if word in MONTHS:
+                return MONTHS[word]
+        return None
+
+    @property
+    def years(self):
+        years = []
+        for year in _YEAR.findall(self.norm):
+            if int(year) not in years:
+                years.append(int(year))
+        return years
+
+    @property
+    def year(self):
+        return self.years[0] if self.years else None
+
+    def week_key(self, week):
+        """(year, week) when the question names a year, else the week number itself."""
+        return (self.year, week) if self.year and week is not None else week
+
+    @property
+    def top_n(self):
+        match = _TOP_N.search(self.norm)
+        if not match:
+            return None
+        value = match.group(1)
+        return NUMBER_WORDS.get(value) or int(value)
+
+    def named(self, index):
+        """The name from index mentioned in the question, however well other names match."""
+        return index.find_in(self.words)[0]
+
+    def product(self, index):
+        """Product named in the question, unless a vendor name matches it better."""
+        label, score = index.find_in(self.words)
+        if label is None:
+            return None
+        vendor, vendor_score = prepared_sales(self.dataset).vendors.find_in(self.words)
+        return label if vendor is None or score >= vendor_score else None
+
+    @property
+    def vendor(self):
+        vendors = prepared_sales(self.dataset).vendors
+        label, score = vendors.find_in(self.words)
+        if label is None:
+            return None
+        _, product_score = prepared_sales(self.dataset).products.find_in(self.words)
+        return label if score > product_score else None
+
+    @property
+    def sales_product(self):
+        return self.product(prepared_sales(self.dataset).products)
+
+    @property
+    def channel_product(self):
+        return self.product(prepared_sheet(self.dataset, "Organic").names)
+
+
+_INTENTS = []
+
+
+def _intent(pattern, *slots):
+    """Register a handler for questions matching pattern once the named slots are filled."""
+    def register(handler):
+        _INTENTS.append((re.compile(pattern), slots, handler))
+        return handler
+    return register
+
+
+def _units(value):
+    return f"{value:,.0f}"
+
+
+def _num(value):
+    return f"{value:,.2f}"
+
+
+def _week_label(week):
+    return f"Week {week[1]} of {week[0]}" if isinstance(week, tuple) else f"Week {week}"
+
+
+def _no_sales(sales, week):
+    """Whether the sales sheet has no rows for a week number or (year, week) key."""
+    return len(sales.week(week)) == 0
+
+
+def _no_rows(df, sheet, week):
+    """A no-data answer when a weekly sheet has no rows for the week, else None."""
+    if week_rows(df, week).empty:
+        return f"📭 The {sheet} sheet has no data for {_week_label(week)}."
+    return None
+
+
+def _qualified_ranking(q):
+    """Whether a product ranking is narrowed (vendor, month, last week) or by another metric than units."""
+    return (q.has(_RELATIVE_WEEK) or q.has(_OTHER_METRIC) or q.month is not None
+            or q.named(prepared_sales(q.dataset).vendors) is not None)
+
+
+def _short(name, limit=80):
+    # Some raw Item Descriptions are whole marketing paragraphs
+    name = str(name)
+    return name if len(name) <= limit else name[:limit].rstrip() + "…"
+
+
+_UNITS = r"\bunits?\b|\bsold\b|\bsell\b|\bsales\b|\bquantity\b"
+# "How many units ...", "total units/sales ...", "units (of X) sold ...", "how much X was sold ..."
+_UNITS_QUESTION = (r"\bhow many (total )?units\b|\btotal (number of )?(units|quantity|sales)\b"
+                   r"|\bunits (of .+ )?sold\b|\bhow much\b.*\b(sold|sell)\b")
+# Why/which/who/... questions ask something other than a units figure
+_NOT_A_COUNT = r"^(why|which|who|whom|when|where|what day|how (did|does|do|has|have|come))\b"
+# Asks for something other than one plain units figure: the LLM answers these
+_UNITS_MODIFIER = (r"\b(avg|average|mean|per|each|every|percent(age)?|share|ratio|rate|excluding|except|without"
+                   r"|vs|versus|compared?)\b|%")
+_RELATIVE_WEEK = r"\b(last|this|previous|prior|past|next|current)\s+week\b"
+# Rankings by anything but units sold
+_OTHER_METRIC = (r"\b(media|organic|cogs|ni|income|share|sv|msv|osv|revenue|value|profit|margin|price|cost"
+                 r"|aed|orders?)\b")
+_BEST = r"\b(top|best|highest|most|max(imum)?|largest)\b"
+_WORST = r"\b(worst|lowest|least|min(imum)?)\b"
+
+
+# ---------- Sales Intents ----------
+@_intent(_BEST + r".*\bvendors\b|\bvendors\b.*" + _BEST, "month")
+def _top_vendors_in_month(q):
+    n = q.top_n or 5
+    vendors = get_top_vendors_by_month(prepared_sales(q.dataset), q.month, q.year, n)
+    scope = MONTH_NAMES[q.month] + (f" {q.year}" if q.year else "")
+    if vendors.empty:
+        return f"📭 No sales were recorded in {scope}."
+    lines = [f"{i}. {name}: {_units(units)} units" for i, (name, units) in enumerate(vendors.items(), 1)]
+    return f"🏪 Top {n} vendors in {scope} by units sold:\n" + "\n".join(lines)
+
+
+@_intent(r"\bweek[\s-]*over[\s-]*week\b|\bwow\b")
+def _week_over_week(q):
+    if not q.has(_UNITS) or q.vendor or len(q.weeks) > 1:
+        return None
+    sales = prepared_sales(q.dataset)
+    if q.year and q.week is None:
+        week = max((key for key in sales.partitions if key[0] == q.year), default=None)
+    else:
+        week = q.week_key(q.week) if q.year else sales.latest_partition(q.week)
+    if week is None or _no_sales(sales, week):
+        return f"📭 No sales were recorded in {_week_label(q.week_key(q.week)) if q.week else q.year}."
+    product = q.sales_product
+    previous, units, change = get_week_over_week_change(sales, week, product)
+    subject = f"{_short(product)} units" if product else "Units sold"
+    trend = f" ({change:+.1%})" if change is not None else ""
+    return (f"📈 {subject} in Week {week[1]} of {week[0]}: {_units(units)} vs {_units(previous)} "
+            f"the week before{trend}.")
+
+
+@_intent(_LAST_N_WEEKS.pattern)
+def _last_n_weeks(q):
+    if not q.has(_UNITS) or q.vendor or q.weeks:
+        return None
+    value = _LAST_N_WEEKS.search(q.norm).group(1)
+    n = NUMBER_WORDS.get(value) or int(value)
+    sales = prepared_sales(q.dataset)
+    end = None
+    if q.year:
+        end = max((key for key in sales.partitions if key[0] == q.year), default=None)
+        if end is None:
+            return f"📭 No sales were recorded in {q.year}."
+    product = q.sales_product
+    rolling = get_rolling_units_sold(sales, n, week=end, product=product)
+    if rolling.empty or n < 1:
+        return None
+    (year, week), units = rolling.index[-1], rolling.iloc[-1]
+    subject = f" of {_short(product)}" if product else ""
+    return f"📦 Units sold{subject} in the {n} weeks up to Week {week} of {year}: {_units(units)}."
+
+
+@_intent(_BEST + r".*\bvendor\b|\bvendor\b.*" + _BEST, "week")
+def _top_vendor_in_week(q):
+    week = q.week_key(q.week)
+    vendor, units = get_top_vendor_by_units(prepared_sales(q.dataset), week)
+    if vendor is None:
+        return f"📭 No sales were recorded in {_week_label(week)}."
+    return f"🏪 The top vendor in {_week_label(week)} was {vendor} with {_units(units)} units sold."
+
+
+@_intent(r"\bcompar|\bvs\b|\bversus\b|\bdifference\b")
+def _compare_weeks(q):
+    if len(q.weeks) != 2 or not q.has(_UNITS) or q.sales_product or q.vendor:
+        return None
+    sales = prepared_sales(q.dataset)
+    week1, week2 = (q.week_key(week) for week in q.weeks)
+    missing = [week for week in (week1, week2) if _no_sales(sales, week)]
+    if missing:
+        return f"📭 No sales were recorded in {_week_label(missing[0])}."
+    units1, units2 = compare_weekly_units_sold(sales, week1, week2)
+    change = f" ({(units2 - units1) / units1:+.1%})" if units1 else ""
+    return (f"📊 Units sold: {_week_label(week1)}: {_units(units1)} vs {_week_label(week2)}: {_units(units2)}"
+            f" — a difference of {_units(units2 - units1)}{change}.")
+
+
+@_intent(r"\btop\s*(\d+|" + "|".join(NUMBER_WORDS) + r")\b.*\bproducts\b", "top_n")
+def _top_n_products(q):
+    if (q.weeks and q.week is None) or (q.year and q.week is None) or _qualified_ranking(q):
+        return None
+    week = q.week_key(q.week)
+    products = get_top_n_performing_products(prepared_sales(q.dataset), n=q.top_n, week=week)
+    scope = f" in {_week_label(week)}" if week is not None else ""
+    if products.empty:
+        return f"📭 No sales were recorded{scope}."
+    lines = [f"{i}. {_short(name)}: {_units(units)} units" for i, (name, units) in enumerate(products.items(), 1)]
+    return f"🏆 Top {q.top_n} products by units sold{scope}:\n" + "\n".join(lines)
+
+
+@_intent(_WORST + r".*\bproduct\b|\bproduct\b.*" + _WORST)
+def _worst_product(q):
+    if q.weeks or q.year or _qualified_ranking(q):
+        return None
+    product, units = get_worst_performing_product(prepared_sales(q.dataset))
+    if product is None:
+        return None
+    return f"📉 The lowest-selling product overall is {_short(product)} with {_units(units)} units sold."
+
+
+@_intent(_BEST + r".*\b(product|selling|seller)\b|\b(product|seller)\b.*" + _BEST)
+def _best_product(q):
+    if len(q.weeks) > 1 or _qualified_ranking(q):
+        return None
+    if q.week is None and q.year:
+        return None
+    if q.week is None:
+        product, units = get_top_performing_product(prepared_sales(q.dataset))
+        if product is None:
+            return None
+        return f"🏆 The best-selling product overall is {_short(product)} with {_units(units)} units sold."
+    week = q.week_key(q.week)
+    product, units = get_highest_units_sold_product(prepared_sales(q.dataset), week)
+    if product is None:
+        return f"📭 No sales were recorded in {_week_label(week)}."
+    return f"🏆 The best-selling product in {_week_label(week)} was {_short(product)} with {_units(units)} units."
+
+
+@_intent(_UNITS_QUESTION)
+def _units_sold(q):
+    # Anything the answer would leave out (a second name or year, a month, a top-N, an average) goes to the LLM
+    if q.has(_NOT_A_COUNT) or q.has(r"\bmedia\b|\borganic\b") or q.has(_UNITS_MODIFIER) or q.has(_RELATIVE_WEEK):
+        return None
+    if len(q.weeks) > 1 or len(q.years) > 1 or q.month or q.top_n:
+        return None
+    sales = prepared_sales(q.dataset)
+    product, vendor = q.named(sales.products), q.named(sales.vendors)
+    if product and vendor:
+        return None
+    week = q.week_key(q.week)
+    if week is not None and _no_sales(sales, week):
+        return f"📭 No sales were recorded in {_week_label(week)}."
+    if product and week is not None:
+        units = get_product_units_sold(sales, product, week)
+        return f"📦 {_short(product)} sold {_units(units)} units in {_week_label(week)}."
+    if vendor and not q.weeks and not q.year:
+        units = get_vendor_units_sold(sales, vendor)
+        return f"🏪 {vendor} sold {_units(units)} units in total."
+    if not product and not vendor and week is not None:
+        units = get_total_units_sold(sales, week)
+        return f"📦 Total units sold in {_week_label(week)}: {_units(units)}."
+    return None
+
+
+# ---------- Organic / Media Intents ----------
+@_intent(r"\bshare\b", "week", "channel_product")
+def _media_organic_share(q):
+    week = q.week_key(q.week)
+    organic, media = prepared_sheet(q.dataset, "Organic"), prepared_sheet(q.dataset, "Media")
+    missing = _no_rows(organic.frame, "Organic", week)
+    if missing:
+        return missing
+    org_share, med_share = compare_media_organic_share(organic, media, q.channel_product, week)
+    if pd.isna(org_share) and pd.isna(med_share):
+        return None
+    fmt = lambda v: "n/a" if pd.isna(v) else f"{v:.2f}%"
+    return (f"📊 {q.channel_product} in {_week_label(week)}: organic share of sales {fmt(org_share)}, "
+            f"media share {fmt(med_share)}.")
+
+
+@_intent(r"\bnegative\b.*\b(ni|net income)\b|\b(ni|net income)\b.*\bnegative\b", "week")
+def _negative_ni_products(q):
+    week, media = q.week_key(q.week), prepared_sheet(q.dataset, "Media")
+    missing = _no_rows(media.frame, "Media", week)
+    if missing:
+        return missing
+    products = get_negative_ni_per_sku_products(media, week)
+    if not products:
+        return f"✅ No media products had negative NI per SKU in {_week_label(week)}."
+    return (f"🔻 Media products with negative NI per SKU in {_week_label(week)}:\n"
+            + "\n".join(f"- {p}" for p in products))
+
+
+@_intent(r"\bpositive\b.*\b(ni|net income)\b|\b(ni|net income)\b.*\bpositive\b", "week")
+def _positive_ni_products(q):
+    week, media = q.week_key(q.week), prepared_sheet(q.dataset, "Media")
+    missing = _no_rows(media.frame, "Media", week)
+    if missing:
+        return missing
+    products = get_positive_ni_per_sku_products(media, week)
+    if not products:
+        return f"📭 No media products had positive NI per SKU in {_week_label(week)}."
+    return (f"🔺 Media products with positive NI per SKU in {_week_label(week)}:\n"
+            + "\n".join(f"- {p}" for p in products))
+
+
+@_intent(r"\btotal\b.*\b(ni|net income)\b.*\bmedia\b|\btotal\b.*\bmedia\b.*\b(ni|net income)\b", "week")
+def _total_ni_media(q):
+    week, media = q.week_key(q.week), prepared_sheet(q.dataset, "Media")
+    missing = _no_rows(media.frame, "Media", week)
+    if missing:
+        return missing
+    total = get_total_ni_media(media, week)
+    return f"💰 Total daily net income from media in {_week_label(week)}: {_num(total)}."
+
+
+@_intent(_BEST + r".*\bmedia units\b|\bmedia units\b.*" + _BEST, "week")
+def _top_media_products(q):
+    top_n = q.top_n or 3
+    week = q.week_key(q.week)
+    products = get_top_products_by_media_units(prepared_sheet(q.dataset, "Media"), week, top_n=top_n)
+    if products.empty:
+        return f"📭 No media sales were recorded in {_week_label(week)}."
+    lines = [f"{i}. {name}: {_units(units)} units" for i, (name, units) in enumerate(products.items(), 1)]
+    return f"📣 Top {top_n} products by media units in {_week_label(week)}:\n" + "\n".join(lines)
+
+
+@_intent(r"\bweek\b.*" + _BEST + r".*\b(daily )?(msv|media sv)\b")
+def _week_highest_msv(q):
+    if q.weeks or q.year:
+        return None
+    week, msv = get_week_with_highest_daily_msv(prepared_sheet(q.dataset, "Media"))
+    return f"📈 Week {week} had the highest daily media SV ({_num(msv)})."
+
+
+@_intent(r"\b(avg|average)\b.*\b(daily )?(osv|organic sv)\b", "week")
+def _avg_daily_osv(q):
+    week, change = q.week_key(q.week), q.dataset.sheet("Overall Avg & Change")
+    missing = _no_rows(change, "Overall Avg & Change", week)
+    if missing:
+        return missing
+    value = get_avg_daily_osv(change, week)
+    if pd.isna(value):
+        return None
+    return f"🌱 Average daily organic SV in {_week_label(week)}: {_num(value)}."
+
+
+@_intent(r"\b(avg|average)\b.*\boverall\b.*\bsv\b", "week")
+def _avg_overall_daily_sv(q):
+    week, change = q.week_key(q.week), q.dataset.sheet("Overall Avg & Change")
+    missing = _no_rows(change, "Overall Avg & Change", week)
+    if missing:
+        return missing
+    value = get_avg_overall_daily_sv(change, week)
+    if value is None or pd.isna(value):
+        return None
+    return f"📊 Average overall daily SV in {_week_label(week)}: {_num(value)}."
+
+
+@_intent(_BEST + r".*\bcogs\b|\bcogs\b.*" + _BEST, "week")
+def _highest_cogs(q):
+    if q.top_n and q.top_n > 1:
+        return None
+    week, organic = q.week_key(q.week), prepared_sheet(q.dataset, "Organic")
+    missing = _no_rows(organic.frame, "Organic", week)
+    if missing:
+        return missing
+    product, cogs = get_highest_cogs_organic(organic, week)
+    if product is None:
+        return None
+    return f"💸 The highest COGS in {_week_label(week)} was {product} at {_num(cogs)}."
+
+
+def answer_locally(question, dataset):
+    """Answer question from the dataset if it matches a known shape, else None."""
+    q = Question(question, dataset)
+    for pattern, slots, handler in _INTENTS:
+        if not pattern.search(q.norm):
+            continue
+        if q.invalid_weeks:
+            return f"⚠️ Week {q.invalid_weeks[0]} is not a valid week number; weeks run from 1 to 53."
+        try:
+            if any(getattr(q, slot) is None for slot in slots):
+                continue
+            answer = handler(q)
+        except (KeyError, ValueError, TypeError):
+            # Sheet or column missing in this workbook: let the LLM handle it
+            continue
+        if answer is not None:
+            return answer
+    return None
@@ -0,0 +1,195 @@
+import os
+import queue
+import random
+import threading
+import time
+
+import httpx
+import openai
+import streamlit as st
+
+# ---------- Shared LLM Client ----------
+# One client per process: a single keep-alive HTTP pool, per-request deadlines,
+# exponential-backoff retries and optional hedged requests. The backend is
+# pluggable so the whole pipeline can run offline against a stub.
+
+MODEL = "gpt-3.5-turbo-1106"
+TEMPERATURE = 0.1  # Slightly higher for more natural responses
+REQUEST_TIMEOUT = float(os.environ.get("KRISPR_LLM_TIMEOUT", 30))
+MAX_RETRIES = int(os.environ.get("KRISPR_LLM_RETRIES", 3))
+BACKOFF_BASE = 0.5
+# Seconds without a first token before a duplicate request is raced; 0 disables hedging
+HEDGE_AFTER = float(os.environ.get("KRISPR_LLM_HEDGE_AFTER", 0))
+
+TRANSIENT_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    httpx.TransportError,
+    TimeoutError,
+)
+
+
+class OpenAIBackend:
+    """ChatOpenAI over one long-lived, keep-alive HTTP connection pool."""
+
+    def __init__(self, api_key=None):
+        from langchain_openai import ChatOpenAI
+
+        self._http = httpx.Client(
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120),
+        )
+        self._llm = ChatOpenAI(
+            model=MODEL,
+            temperature=TEMPERATURE,
+            api_key=api_key or os.environ.get("OPENAI_API_KEY") or st.secrets["OPENAI_API_KEY"],
+            http_client=self._http,
+            timeout=REQUEST_TIMEOUT,
+            max_retries=0,  # retried by LLMClient, which knows whether tokens were already shown
+        )
+
+    def stream(self, prompt):
+        for chunk in self._llm.stream(prompt):
+            if chunk.content:
+                yield chunk.content
+
+
+class StubBackend:
+    """Deterministic offline backend that streams a canned reply word by word."""
+
+    def __init__(self, delay=None):
+        self.delay = float(os.environ.get("KRISPR_LLM_STUB_DELAY", 0) if delay is None else delay)
+
+    def stream(self, prompt):
+        if "**SQL Question:**" in prompt:
+            reply = "```sql\nSELECT COUNT(*) AS order_lines, SUM(sold_quantity) AS units FROM sales\n```"
+        else:
+            question = prompt.rsplit("**User Question:**", 1)[-1].strip().splitlines()[0] if prompt else ""
+            reply = f"🧪 Offline stub answer to: {question} (prompt of {len(prompt)} characters)"
+        for word in reply.split(" "):
+            if self.delay:
+                time.sleep(self.delay)
+            yield word + " "
+
+
+BACKENDS = {"openai": OpenAIBackend, "stub": StubBackend}
+
+
+def register_backend(name, factory):
+    """Make a backend selectable through KRISPR_LLM_BACKEND=<name>."""
+    BACKENDS[name] = factory
+
+
+_DONE = object()
+
+
+class _Attempt:
+    """One request running on a background thread, feeding a shared queue."""
+
+    def __init__(self, backend, prompt, out):
+        self.cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._pump, args=(backend, prompt, out), daemon=True)
+        self._thread.start()
+
+    def _pump(self, backend, prompt, out):
+        try:
+            tokens = backend.stream(prompt)
+            try:
+                for token in tokens:
+                    if self.cancelled.is_set():
+                        return
+                    out.put((self, token))
+            finally:
+                close = getattr(tokens, "close", None)
+                if close:
+                    close()
+            out.put((self, _DONE))
+        except Exception as e:
+            out.put((self, e))
+
+
+class LLMClient:
+    """Streams completions with a deadline, retries on transient errors and optional hedging."""
+
+    def __init__(self, backend, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES, hedge_after=HEDGE_AFTER):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+
+    def stream(self, prompt):
+        """Yield the completion for prompt token by token."""
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                for token in self._race(prompt):
+                    started = True
+                    yield token
+                return
+            except TRANSIENT_ERRORS:
+                # Once tokens are on screen a retry would repeat them, so give up instead
+                if started or attempt == self.max_retries:
+                    raise
+                time.sleep(BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def complete(self, prompt):
+        return "".join(self.stream(prompt))
+
+    def _race(self, prompt):
+        """Run the request, racing a duplicate if the first token is slow to arrive."""
+        out = queue.Queue()
+        attempts = [_Attempt(self.backend, prompt, out)]
+        winner, errors = None, []
+        deadline = time.monotonic() + self.timeout
+        hedge_at = time.monotonic() + self.hedge_after if self.hedge_after else None
+        try:
+            while True:
+                now = time.monotonic()
+                if winner is None and now >= deadline:
+                    raise TimeoutError(f"No response from the LLM within {self.timeout:g}s")
+                if hedge_at is not None and winner is None and now >= hedge_at:
+                    attempts.append(_Attempt(self.backend, prompt, out))
+                    hedge_at = None
+                wait_until = deadline if hedge_at is None else min(deadline, hedge_at)
+                try:
+                    source, item = out.get(timeout=max(0.0, wait_until - now) if winner is None else self.timeout)
+                except queue.Empty:
+                    if winner is not None:
+                        raise TimeoutError(f"The LLM stream stalled for {self.timeout:g}s")
+                    continue
+                if winner is not None and source is not winner:
+                    continue
+                if isinstance(item, Exception):
+                    errors.append(item)
+                    # A failed attempt only matters once every racer has failed
+                    if winner is not None or len(errors) == len(attempts):
+                        raise item
+                    continue
+                if item is _DONE:
+                    if winner is None:
+                        winner = source
+                    return
+                if winner is None:
+                    winner = source
+                    for other in attempts:
+                        if other is not winner:
+                            other.cancelled.set()
+                yield item
+        finally:
+            for attempt in attempts:
+                attempt.cancelled.set()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """The process-wide LLMClient, using the backend named by KRISPR_LLM_BACKEND."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(BACKENDS[os.environ.get("KRISPR_LLM_BACKEND", "openai")]())
+        return _client
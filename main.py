@@ -1,9 +1,16 @@
 import streamlit as st
 import os
-import gdown
-from connect import main_chatbot
+import time
+from connect import main_chatbot_stream
+from dataset import cache_stats, cached_dataset, cached_datasets
+from registry import dataset_path, list_datasets, register_dataset, remove_dataset
+from refresh import current_refresh, start_refresh
+from answer_cache import get_answer_cache
+from request_pool import get_request_pool
+from metrics import read_traces, summarize
+from batch import answer_batch, read_questions, results_csv, summarize_results
+from schema import memory_report
 
-EXCEL_PATH = "latest_file.xlsx"
 ADMIN_PASSWORD = st.secrets.get("admin_password", "krispr2024")  # Set in .streamlit/secrets.toml
 
 st.set_page_config(page_title="KRISPR Digital Business Analyst", layout="centered")
@@ -109,36 +116,57 @@ html, body, .stApp {
 if page == "Chatbot":
     st.markdown('<div class="main-title">🤖 KRISPR Digital Business Analyst</div>', unsafe_allow_html=True)
 
-    if not os.path.exists(EXCEL_PATH):
+    # --- Each registered workbook (brand, region, snapshot) is its own dataset ---
+    datasets = {entry["name"]: entry["label"] for entry in list_datasets()}
+    dataset_name = next(iter(datasets))
+    if len(datasets) > 1:
+        dataset_name = st.selectbox("📂 Dataset", list(datasets), format_func=datasets.get, key="dataset_name")
+    excel_path = dataset_path(dataset_name)
+
+    if not os.path.exists(excel_path):
         st.warning("⚠️ Excel file not found. Please upload it from Admin Panel.")
         st.stop()
 
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
+    # Each dataset keeps its own conversation
+    if "chat_histories" not in st.session_state:
+        st.session_state.chat_histories = {}
+    chat_history = st.session_state.chat_histories.setdefault(dataset_name, [])
     if "pending_user_input" not in st.session_state:
         st.session_state.pending_user_input = None
 
-    # --- FIX: Process pending input BEFORE rendering the form ---
-    if st.session_state.pending_user_input:
-        st.session_state.chat_history.append(("user", st.session_state.pending_user_input))
+    def message_html(role, msg):
+        css_class = "user" if role == "user" else "bot"
+        avatar = "" if role == "user" else "🧠"
+        avatar_html = f'<div class="avatar">{avatar}</div>' if avatar else ""
+        return f'<div class="message {css_class}">{avatar_html}<div>{msg}</div></div>'
+
+    pending = st.session_state.pending_user_input
+    if pending:
+        chat_history.append(("user", pending))
+
+    st.markdown('<div class="chat-box">', unsafe_allow_html=True)
+    for role, msg in chat_history:
+        st.markdown(message_html(role, msg), unsafe_allow_html=True)
+
+    # --- Stream the answer to the pending question into a live bot bubble ---
+    if pending:
+        bubble = st.empty()
+        bubble.markdown(message_html("bot", "Analyzing..."), unsafe_allow_html=True)
+        response = ""
+        last_render = 0.0
         try:
-            with st.spinner("Analyzing..."):
-                response = main_chatbot(st.session_state.pending_user_input, EXCEL_PATH)
-            st.session_state.chat_history.append(("bot", response))
+            for token in main_chatbot_stream(pending, excel_path):
+                response += token
+                # Redraw at most ~20 times a second; fast streams arrive in many tiny chunks
+                if time.monotonic() - last_render > 0.05:
+                    bubble.markdown(message_html("bot", response + " ▌"), unsafe_allow_html=True)
+                    last_render = time.monotonic()
         except Exception as e:
-            st.session_state.chat_history.append(("bot", f"⚠️ Error: {e}"))
+            response = f"⚠️ Error: {e}"
+        bubble.markdown(message_html("bot", response), unsafe_allow_html=True)
+        chat_history.append(("bot", response))
         st.session_state.pending_user_input = None
         st.rerun()  # <--- This ensures the chat updates immediately
-
-    st.markdown('<div class="chat-box">', unsafe_allow_html=True)
-    for role, msg in st.session_state.chat_history:
-        css_class = "user" if role == "user" else "bot"
-        avatar = "" if role == "user" else "🧠"
-        avatar_html = f'<div class="avatar">{avatar}</div>' if avatar else ""
-        st.markdown(
-            f'<div class="message {css_class}">{avatar_html}<div>{msg}</div></div>',
-            unsafe_allow_html=True
-        )
     st.markdown('</div>', unsafe_allow_html=True)
 
     # Input form
@@ -179,19 +207,128 @@ elif page == "Admin Panel":
         st.session_state.admin_authenticated = False
         st.experimental_rerun()
 
+    # --- Datasets: one workbook per brand, region or historical snapshot ---
+    st.subheader("📂 Datasets")
+    datasets = {entry["name"]: entry for entry in list_datasets()}
+    dataset_name = st.selectbox(
+        "Dataset to manage:", list(datasets), format_func=lambda name: f"{datasets[name]['label']} ({name})",
+        key="admin_dataset",
+    )
+    excel_path = dataset_path(dataset_name)
+    with st.expander("➕ Register a Dataset"):
+        new_name = st.text_input("Name (lowercase letters, digits, - and _):")
+        new_label = st.text_input("Label shown in the chat:")
+        if st.button("Register"):
+            try:
+                entry = register_dataset(new_name, new_label.strip() or None)
+                st.success(f"✅ Registered '{entry['name']}'. Download its workbook below.")
+            except ValueError as e:
+                st.error(f"❌ {e}")
+    if dataset_name != "default" and st.button("🗑️ Remove Dataset"):
+        remove_dataset(dataset_name)
+        st.rerun()
+
     file_id = st.text_input("Paste Google Drive File ID here:")
 
     if st.button("⬇️ Download and Replace File"):
         if file_id.strip():
-            try:
-                url = f"https://drive.google.com/uc?id={file_id.strip()}"
-                gdown.download(url, EXCEL_PATH, quiet=False)
-                st.success("✅ Excel file updated successfully.")
-            except Exception as e:
-                st.error(f"❌ Failed to download: {e}")
+            # Runs in the background: chats keep using the current file until the new one is ready
+            register_dataset(dataset_name, source=file_id.strip())
+            start_refresh(file_id.strip(), excel_path)
         else:
             st.warning("⚠️ Please enter a valid file ID.")
 
+    job = current_refresh(excel_path)
+    if job is not None:
+        if job.running:
+            st.info(f"⏳ {job.message}...")
+            st.button("🔄 Refresh Status")
+        elif job.error:
+            st.error(f"❌ {job.message}")
+        else:
+            st.success(f"✅ {job.message} (version {job.version}).")
+
+    # --- Batch questions: one workbook load, local answers first, bounded LLM fan-out ---
+    st.subheader("📋 Batch Questions")
+    upload = st.file_uploader("Upload a CSV or JSONL of questions:", type=["csv", "jsonl"])
+    if upload is not None and st.button("▶️ Answer All Questions"):
+        if not os.path.exists(excel_path):
+            st.warning("⚠️ Excel file not found. Please download it first.")
+        else:
+            try:
+                questions = read_questions(upload)
+                bar = st.progress(0.0, text=f"0/{len(questions)} answered")
+                started = time.monotonic()
+                results = answer_batch(
+                    questions, excel_path,
+                    progress=lambda done, total: bar.progress(done / total, text=f"{done}/{total} answered"),
+                )
+                st.session_state.batch_results = (results, summarize_results(results, time.monotonic() - started))
+            except Exception as e:
+                st.error(f"❌ Batch failed: {e}")
+    if st.session_state.get("batch_results"):
+        results, summary = st.session_state.batch_results
+        routes = ", ".join(f"{count} {route}" for route, count in summary["routes"].items())
+        st.success(f"✅ {summary['questions']} questions answered in {summary['seconds']}s ({routes}).")
+        st.download_button("⬇️ Download Answers (CSV)", results_csv(results), file_name="batch_answers.csv",
+                           mime="text/csv")
+
+    stats = cache_stats()
+    st.caption(
+        f"📦 Workbook cache: {stats['hits']} hits, {stats['misses']} misses "
+        f"({stats['hit_rate']:.0%} hit rate), {stats['invalidations']} invalidations, {stats['evictions']} evicted; "
+        f"{stats['entries']} loaded using {stats['bytes'] / 1e6:,.1f} of {stats['budget_bytes'] / 1e6:,.0f} MB"
+    )
+    loaded = {os.path.abspath(entry["path"]): entry for entry in cached_datasets()}
+    stored = get_answer_cache().entries_by_version()
+    rows = []
+    for name, entry in datasets.items():
+        cached = loaded.get(os.path.abspath(entry["path"]))
+        rows.append({
+            "Dataset": entry["label"], "Name": name, "Workbook": entry["path"],
+            "Status": cached["segment"] if cached else ("not loaded" if os.path.exists(entry["path"]) else "no file"),
+            "Memory (MB)": f"{cached['bytes'] / 1e6:,.1f}" if cached else "",
+            "Stored answers": stored.get(cached["version"], 0) if cached else "",
+        })
+    st.table(rows)
+    live = cached_dataset(excel_path)
+    if live is not None:
+        memory = memory_report(live.loaded_sheets())
+        st.caption(
+            f"🧠 Loaded sheets memory: {sum(m['bytes'] for m in memory) / 1e6:,.1f} MB — "
+            + ", ".join(f"{m['sheet']} {m['bytes'] / 1e6:,.2f} MB ({m['rows']:,} rows)" for m in memory)
+        )
+    answers = get_answer_cache().stats()
+    st.caption(
+        f"💬 Answer cache: {answers['hits']} hits, {answers['misses']} misses "
+        f"({answers['hit_rate']:.0%} hit rate), {answers['entries']} stored, {answers['evictions']} evicted"
+    )
+    pool = get_request_pool().stats()
+    st.caption(
+        f"🧵 LLM pool: {pool['in_flight']} in flight, {pool['queued']} queued, "
+        f"{pool['started']} started, {pool['coalesced']} coalesced"
+    )
+
+    # --- Per-stage latency from the chat trace log ---
+    st.subheader("⏱️ Chat Latency")
+    traces = summarize(read_traces())
+    if traces["requests"]:
+        st.caption(
+            f"Last {traces['requests']} requests: {traces['local_rate']:.0%} answered locally, "
+            f"{traces['answer_cache_hit_rate']:.0%} answer cache hits, {traces['coalesced_rate']:.0%} coalesced, "
+            f"{traces['prompt_tokens']:,} prompt / {traces['completion_tokens']:,} completion tokens"
+        )
+        st.table([
+            {
+                "Stage": row["stage"], "Requests": row["count"],
+                "p50 (ms)": f"{row['p50_ms']:,.1f}", "p95 (ms)": f"{row['p95_ms']:,.1f}",
+                "p99 (ms)": f"{row['p99_ms']:,.1f}",
+            }
+            for row in traces["stages"]
+        ])
+    else:
+        st.caption("No chat requests traced yet.")
+
 # ---- Footer ----
 st.markdown("""
 <hr>
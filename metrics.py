@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - token counts fall back to an estimate
+    tiktoken = None
+
+# ---------- Per-request Chat Traces ----------
+# Every chat request records how long each stage took (workbook load, local
+# answer, cache lookup, queueing, context building, retrieval, SQL, LLM) and how many
+# tokens went to and from the model. Records are appended to a JSONL file and
+# handed to any registered exporters; the Admin Panel summarises the file.
+# The file is rotated to <path>.1 once it passes TRACE_MAX_BYTES, and only the
+# end of it is read back.
+
+TRACE_PATH = os.environ.get("KRISPR_TRACE_LOG", "chat_trace.jsonl")  # empty disables the file
+SUMMARY_WINDOW = int(os.environ.get("KRISPR_TRACE_WINDOW", 5000))
+TRACE_MAX_BYTES = int(float(os.environ.get("KRISPR_TRACE_MAX_MB", 50)) * 1e6)
+_TAIL_BLOCK = 1 << 16
+
+STAGES = ["load", "local", "answer_cache", "queue", "context", "retrieval", "sql", "llm_first_token", "llm",
+          "first_chunk", "total"]
+
+_write_lock = threading.Lock()
+_exporters = []
+_encoder = None
+
+
+def register_exporter(exporter):
+    """Call exporter(record) for every finished trace, e.g. to forward it to a metrics backend."""
+    _exporters.append(exporter)
+
+
+def count_tokens(text, model=None):
+    """Tokens in text for the chat model; ~4 characters per token when tiktoken is unavailable."""
+    global _encoder
+    if tiktoken is not None and _encoder is None:
+        try:
+            _encoder = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except Exception:   # unknown model or no network to fetch the encoding
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+class Trace:
+    """Stage timings and token counts for one chat request."""
+
+    def __init__(self, question):
+        self.started = time.monotonic()
+        self.record = {"ts": time.time(), "question": question, "route": None, "stages": {}}
+        self._finished = False
+
+    @contextmanager
+    def stage(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - start)
+
+    def add(self, name, seconds):
+        stages = self.record["stages"]
+        stages[name] = round(stages.get(name, 0.0) + seconds * 1000, 3)
+
+    def mark(self, name):
+        """Record the time from the start of the request to now as stage name (once)."""
+        if name not in self.record["stages"]:
+            self.add(name, time.monotonic() - self.started)
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+    def finish(self, path=TRACE_PATH):
+        """Write the record and pass it to the exporters; later calls do nothing."""
+        if self._finished:
+            return
+        self._finished = True
+        self.mark("total")
+        if path:
+            line = json.dumps(self.record, ensure_ascii=False, default=str)
+            with _write_lock:
+                _rotate(path)
+                with open(path, "a", encoding="utf-8") as fh:
+                    fh.write(line + "\n")
+        for exporter in list(_exporters):
+            try:
+                exporter(self.record)
+            except Exception:
+                pass   # telemetry must never break a chat answer
+
+
+def _rotate(path):
+    """Move a trace file past TRACE_MAX_BYTES to <path>.1, replacing the previous one."""
+    try:
+        if os.path.getsize(path) >= TRACE_MAX_BYTES:
+            os.replace(path, path + ".1")
+    except OSError:
+        pass   # no file yet, or another process rotated it first
+
+
+def _tail_lines(path, limit):
+    """The last `limit` non-empty lines of a file, reading blocks backwards from its end."""
+    try:
+        fh = open(path, "rb")
+    except OSError:
+        return []
+    blocks, newlines = [], 0
+    with fh:
+        position = fh.seek(0, os.SEEK_END)
+        while position > 0 and newlines <= limit:
+            step = min(_TAIL_BLOCK, position)
+            position -= step
+            fh.seek(position)
+            blocks.append(fh.read(step))
+            newlines += blocks[-1].count(b"\n")
+    lines = b"".join(reversed(blocks)).split(b"\n")
+    if position > 0:
+        lines = lines[1:]   # starts mid-line
+    lines = [line for line in lines if line.strip()]
+    return lines[-limit:] if limit > 0 else []
+
+
+def read_traces(path=TRACE_PATH, limit=SUMMARY_WINDOW):
+    """The most recent `limit` trace records, from the end of the file (and the rotated one before it)."""
+    if not path:
+        return []
+    lines = _tail_lines(path, limit)
+    if len(lines) < limit:
+        lines = _tail_lines(path + ".1", limit - len(lines)) + lines
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue   # a line cut short by a crash
+    return records
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(records):
+    """p50/p95/p99 per stage in ms, request counts per route and cache hit rates."""
+    by_stage = {}
+    routes = {}
+    for record in records:
+        routes[record.get("route")] = routes.get(record.get("route"), 0) + 1
+        for name, ms in record.get("stages", {}).items():
+            by_stage.setdefault(name, []).append(ms)
+    stages = []
+    for name in STAGES + sorted(set(by_stage) - set(STAGES)):
+        values = sorted(by_stage.get(name, []))
+        if values:
+            stages.append({
+                "stage": name, "count": len(values),
+                "p50_ms": _percentile(values, 0.50),
+                "p95_ms": _percentile(values, 0.95),
+                "p99_ms": _percentile(values, 0.99),
+            })
+    # Greetings and errors never reach the caches, so they are left out of the rates
+    answered = sum(routes.get(r, 0) for r in ("local", "cached", "coalesced", "llm"))
+    cache_lookups = sum(routes.get(r, 0) for r in ("cached", "coalesced", "llm"))
+    llm = [r for r in records if r.get("route") == "llm"]
+    return {
+        "requests": len(records),
+        "routes": routes,
+        "stages": stages,
+        "local_rate": routes.get("local", 0) / answered if answered else 0.0,
+        "answer_cache_hit_rate": routes.get("cached", 0) / cache_lookups if cache_lookups else 0.0,
+        "coalesced_rate": routes.get("coalesced", 0) / cache_lookups if cache_lookups else 0.0,
+        "prompt_tokens": sum(r.get("prompt_tokens", 0) for r in llm),
+        "completion_tokens": sum(r.get("completion_tokens", 0) for r in llm),
+    }
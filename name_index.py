@@ -0,0 +1,154 @@
+import difflib
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(text):
+    """Lowercase and collapse punctuation/whitespace: "Talabat Mart , Al Hosn" -> "talabat mart al hosn"."""
+    return _NON_ALNUM.sub(" ", str(text).lower()).strip()
+
+
+def stem_token(token):
+    # Just enough to make "tomato"/"tomatoes" and "cucumber"/"cucumbers" meet
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith("oes"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def _tokens(normalized):
+    return frozenset(stem_token(t) for t in normalized.split())
+
+
+# Line breaks (real or escaped), bullets and sentence ends
+_SEGMENT = re.compile(r"\n|\\n|•|(?<=[.!?])\s")
+
+
+def product_title(label):
+    """The title of a label, dropping the marketing description some Item Descriptions carry.
+
+    That is the first line or sentence that is not a heading such as "Nutritional Benefits:".
+    """
+    label = str(label)
+    for segment in _SEGMENT.split(label):
+        segment = segment.strip()
+        if segment and not segment.endswith(":"):
+            return segment
+    return label
+
+
+# ---------- Name Index ----------
+class NameIndex:
+    """Normalized name -> row positions for one text column, plus fuzzy resolution.
+
+    Built once per sheet and workbook version so product/vendor filters become
+    dictionary hits instead of lowercasing and comparing the whole column.
+    """
+
+    def __init__(self, values):
+        values = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype("category")
+        codes = values.cat.codes.to_numpy()
+        rows_by_code = pd.Series(np.arange(len(codes))).groupby(codes).indices
+
+        self._labels = {}   # normalized -> original labels, in category order
+        self._rows = {}     # normalized -> sorted row positions
+        for code, label in enumerate(values.cat.categories):
+            key = normalize_name(label)
+            self._labels.setdefault(key, []).append(label)
+            if code in rows_by_code:
+                self._rows.setdefault(key, []).append(rows_by_code[code])
+        self._rows = {key: np.sort(np.concatenate(parts)) for key, parts in self._rows.items()}
+        # Match on titles only: description paragraphs would make every word a hit
+        self._titles = {key: normalize_name(product_title(labels[0])) for key, labels in self._labels.items()}
+        self._tokens = {key: _tokens(title) for key, title in self._titles.items()}
+        self._resolved = {}   # (normalized text, cutoff) -> closest key or None
+
+        # Words shared by most names ("krispr", "talabat") say little about which one is meant
+        counts = {}
+        for tokens in self._tokens.values():
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+        total = len(self._tokens)
+        self._idf = {token: math.log(1 + total / count) for token, count in counts.items()}
+        self._distinctive = {token for token, count in counts.items() if count <= max(1, total // 2)}
+
+    def __contains__(self, name):
+        return normalize_name(name) in self._labels
+
+    @property
+    def names(self):
+        """One canonical label per normalized name."""
+        return [labels[0] for labels in self._labels.values()]
+
+    def labels(self, name):
+        """Every spelling in the data that normalizes to the same name, or to the name resolve picks."""
+        return self._labels.get(self._key(name), [])
+
+    def rows(self, name):
+        return self._rows.get(self._key(name), np.empty(0, dtype=np.intp))
+
+    def rows_containing(self, text):
+        """Row positions of every name containing text, scanning unique names only."""
+        needle = normalize_name(text)
+        parts = [rows for key, rows in self._rows.items() if needle in key]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+
+    def resolve(self, text, cutoff=0.6):
+        """Map free text such as "baby tomato" onto the closest canonical name, or None."""
+        key = self._key(text, cutoff)
+        return self._labels[key][0] if key is not None else None
+
+    def _key(self, text, cutoff=0.6):
+        key = normalize_name(text)
+        if key in self._labels:
+            return key
+        if (key, cutoff) not in self._resolved:
+            if len(self._resolved) > 1024:
+                self._resolved.clear()
+            self._resolved[(key, cutoff)] = self._fuzzy(key, cutoff)
+        return self._resolved[(key, cutoff)]
+
+    def _fuzzy(self, key, cutoff):
+        query = _tokens(key)
+        if not query:
+            return None
+        best, best_score = None, (cutoff, 0.0, 0.0)
+        for name, tokens in self._tokens.items():
+            overlap = len(query & tokens)
+            if not overlap:
+                continue
+            # Cover the query first, then prefer names without extra words, then spelling
+            score = (
+                overlap / len(query),
+                overlap / len(query | tokens),
+                difflib.SequenceMatcher(None, key, self._titles[name]).ratio(),
+            )
+            if score > best_score:
+                best, best_score = name, score
+        return best
+
+    def find_in(self, words):
+        """The name best matching a bag of words taken from a question, as (label, score).
+
+        Only words that single out a minority of names count, so "krispr" or
+        "talabat" alone never select anything. Returns (None, 0.0) on no match.
+        """
+        words = frozenset(stem_token(w) for w in words)
+        best, best_score = None, (0.0, 0.0)
+        for name, tokens in self._tokens.items():
+            matched = words & tokens
+            if not matched & self._distinctive:
+                continue
+            weight = sum(self._idf[t] for t in matched)
+            score = (weight, weight / sum(self._idf[t] for t in tokens))
+            if score > best_score:
+                best, best_score = name, score
+        return (self._labels[best][0], best_score[0]) if best is not None else (None, 0.0)
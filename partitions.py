@@ -0,0 +1,74 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# ---------- ISO Week Partitions ----------
+# Sales rows are grouped by ISO (year, week): one partition per week, however the
+# sheet is ordered. Each partition gets a content digest, so a new workbook
+# version can be compared with the previous one partition by partition: unchanged
+# weeks keep their stored snapshot files and aggregates, and only new or edited
+# weeks are processed.
+
+
+def iso_week_keys(dates):
+    """ISO years and weeks of a date column as float arrays (NaN for unparseable dates)."""
+    iso = pd.to_datetime(dates, errors="coerce").dt.isocalendar()
+    years = iso["year"].to_numpy(dtype="float64", na_value=np.nan)
+    weeks = iso["week"].to_numpy(dtype="float64", na_value=np.nan)
+    return years, weeks
+
+
+def partition_key(year, week):
+    """(year, week) as ints, or None for rows without a date."""
+    return None if np.isnan(week) else (int(year), int(week))
+
+
+def partition_rows(df, date_col):
+    """[(key, row positions)] with exactly one entry per ISO week, in (year, week) order, undated rows last.
+
+    Rows keep their sheet order within a week, so an unsorted sheet still gives
+    one partition per week rather than one per run of equal dates.
+    """
+    if len(df) == 0:
+        return []
+    years, weeks = iso_week_keys(df[date_col])
+    codes = np.where(np.isnan(weeks), np.inf, years * 100 + weeks)
+    order = np.argsort(codes, kind="stable")
+    ordered = codes[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    stops = np.r_[starts[1:], len(df)]
+    return [(partition_key(years[order[s]], weeks[order[s]]), order[s:e]) for s, e in zip(starts, stops)]
+
+
+def digest_rows(df):
+    """Content digest of a block of rows (values, column names and dtypes, not the index)."""
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    digest = hashlib.sha256(hashes.tobytes())
+    digest.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    # Same values stored as int64/str and int32/category must not share a partition file
+    digest.update("\x1f".join(map(str, df.dtypes)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def combine_digests(digests):
+    return hashlib.sha256("\x1f".join(digests).encode("ascii")).hexdigest()[:16]
+
+
+def week_digests(parts):
+    """{(year, week) or None: digest} from snapshot parts, combining a week's runs in row order."""
+    runs = {}
+    for part in parts:
+        key = tuple(part["key"]) if part["key"] is not None else None
+        runs.setdefault(key, []).append(part["digest"])
+    return {key: digests[0] if len(digests) == 1 else combine_digests(digests) for key, digests in runs.items()}
+
+
+def diff_partitions(old, new):
+    """Compare {key: digest} maps of two versions."""
+    return {
+        "added": sorted((k for k in new if k not in old), key=str),
+        "changed": sorted((k for k in new if k in old and old[k] != new[k]), key=str),
+        "removed": sorted((k for k in old if k not in new), key=str),
+        "unchanged": sum(1 for k in new if old.get(k) == new[k]),
+    }
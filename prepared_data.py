@@ -0,0 +1,441 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+import pandas as pd
+
+from name_index import NameIndex, normalize_name
+from partitions import week_digests
+from snapshot import snapshot_partitions
+
+RAW_SHEET = "Raw Data - Date Wise"
+DATE_COL = "Local Order Date"
+TEXT_COLUMNS = ["Item Description", "Vendor Name"]
+
+# Weekly product sheets and the column holding their product names
+PRODUCT_SHEETS = {"Organic": "PRODUCT NAME", "Media": "Product Name"}
+# Per-week rankings the business logic slices: (column, descending, per-product totals)
+RANKINGS = {
+    "Organic": [("COGS", True, False), ("Organic Share of Sales %", False, False), ("Daily Organic SV", True, False)],
+    "Media": [("NI per SKU", True, False), ("NI per SKU", False, False), ("Total Daily NI Media", True, False),
+              ("Media Units Sold", True, True)],
+}
+
+
+# ---------- Prepared Sales Frame ----------
+class PreparedSales:
+    """Raw sales rows sorted by ISO (year, week) with date parts and a week index built once."""
+
+    def __init__(self, raw_data, date_col=DATE_COL, partitions=None, reuse=None):
+        """partitions: the sheet's snapshot partition entries; reuse: cube pieces of the previous version."""
+        self.date_col = date_col
+        dates = pd.to_datetime(raw_data[date_col], errors="coerce")
+        iso = dates.dt.isocalendar()
+        frame = raw_data.assign(Year=iso["year"], Week=iso["week"], Month=dates.dt.month)
+        for col in TEXT_COLUMNS:
+            if col in frame.columns:
+                frame[col] = frame[col].astype("category")
+        self.frame = frame.sort_values(["Year", "Week"], kind="stable", na_position="last").reset_index(drop=True)
+        self._partitions = self._index_partitions()   # [((year, week), slice)] in sorted order
+        self._keys = [key for key, _ in self._partitions]
+        self._key_slices = dict(self._partitions)
+        self._week_slices = {}   # ISO week number -> [(year, slice)]
+        for (year, week), rows in self._partitions:
+            self._week_slices.setdefault(week, []).append((year, rows))
+        self.products = NameIndex(self.frame["Item Description"])
+        self.vendors = NameIndex(self.frame["Vendor Name"])
+        self._digests = week_digests(partitions) if partitions else None
+        self._reuse = reuse
+        self._cube = None
+
+    def _index_partitions(self):
+        """[((year, week), slice)] over the contiguous runs of the sorted frame."""
+        years = self.frame["Year"].to_numpy(dtype="float64", na_value=np.nan)
+        weeks = self.frame["Week"].to_numpy(dtype="float64", na_value=np.nan)
+        valid = ~np.isnan(weeks)
+        n = int(valid.sum())  # NaT rows are sorted to the end
+        if n == 0:
+            return []
+        keys = years[:n] * 100 + weeks[:n]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        stops = np.r_[starts[1:], n]
+        return [((int(years[start]), int(weeks[start])), slice(int(start), int(stop)))
+                for start, stop in zip(starts, stops)]
+
+    @property
+    def weeks(self):
+        return sorted(self._week_slices)
+
+    @property
+    def partitions(self):
+        """Sorted (ISO year, week) keys that have rows."""
+        return list(self._keys)
+
+    def latest_partition(self, week=None):
+        """The newest (year, week) key, or the newest one of an ISO week number."""
+        if week is None:
+            return self._keys[-1] if self._keys else None
+        runs = self._week_slices.get(int(week), [])
+        return (runs[-1][0], int(week)) if runs else None
+
+    def week(self, week):
+        """Rows of one week, located through the partition index instead of a full-table mask.
+
+        week is an (ISO year, week) tuple, or an ISO week number meaning that week in every year.
+        """
+        if isinstance(week, tuple):
+            rows = self._key_slices.get((int(week[0]), int(week[1])))
+            return self.frame.iloc[rows] if rows is not None else self.frame.iloc[0:0]
+        runs = self._week_slices.get(int(week), [])
+        if not runs:
+            return self.frame.iloc[0:0]
+        if len(runs) == 1:
+            return self.frame.iloc[runs[0][1]]
+        return pd.concat([self.frame.iloc[s] for _, s in runs])
+
+    def weeks_between(self, start, end):
+        """Rows of every (year, week) partition from start to end inclusive: one contiguous slice."""
+        lo = bisect_left(self._keys, (int(start[0]), int(start[1])))
+        hi = bisect_right(self._keys, (int(end[0]), int(end[1])))
+        if lo >= hi:
+            return self.frame.iloc[0:0]
+        return self.frame.iloc[self._partitions[lo][1].start:self._partitions[hi - 1][1].stop]
+
+    def dates_between(self, start, end):
+        """Rows dated from start to end (whole days, inclusive); only the covering weeks are scanned."""
+        start = pd.Timestamp(start).normalize()
+        stop = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+        first, last = start.isocalendar(), (stop - pd.Timedelta(days=1)).isocalendar()
+        rows = self.weeks_between((first[0], first[1]), (last[0], last[1]))
+        dates = pd.to_datetime(rows[self.date_col], errors="coerce")
+        return rows[(dates >= start) & (dates < stop)]
+
+    def week_partitions(self):
+        """{(year, week) or None: (slice, digest)} in sorted order, or None without digests."""
+        if self._digests is None:
+            return None
+        parts = dict(self._partitions)
+        dated = self._partitions[-1][1].stop if self._partitions else 0
+        if dated < len(self.frame):
+            parts[None] = slice(dated, len(self.frame))
+        if set(parts) != set(self._digests):
+            return None
+        return {key: (rows, self._digests[key]) for key, rows in parts.items()}
+
+    @property
+    def cube(self):
+        """Aggregate cube over these rows, materialised on first use."""
+        if self._cube is None:
+            self._cube = SalesCube(self.frame, weeks=self.week_partitions(), reuse=self._reuse)
+            self._reuse = None
+        return self._cube
+
+    def reusable(self):
+        """Per-week cube pieces the next workbook version can reuse for unchanged weeks."""
+        return self._cube.parts if self._cube is not None and self._cube.parts else None
+
+
+# ---------- Sales Aggregate Cube ----------
+class SalesCube:
+    """Sold Quantity summed per (year, week, month, product, vendor) with cached roll-ups.
+
+    Rows grow every week while the number of groups stays small, so answering
+    from roll-ups costs O(groups) instead of O(rows).
+    """
+
+    LEVELS = ["Year", "Week", "Month", "Item Description", "Vendor Name"]
+    ROLLUPS = [
+        ("Week",), ("Month",), ("Item Description",), ("Vendor Name",),
+        ("Week", "Item Description"), ("Week", "Vendor Name"),
+        ("Month", "Item Description"), ("Month", "Vendor Name"),
+        ("Item Description", "Vendor Name"), ("Week", "Month"),
+        ("Year", "Week"), ("Year", "Week", "Item Description"), ("Year", "Week", "Vendor Name"),
+    ]
+
+    def __init__(self, frame, value="Sold Quantity", weeks=None, reuse=None):
+        """weeks: {(year, week): (slice, digest)} builds the cube week by week, taking the
+        pieces of weeks whose digest is in reuse instead of aggregating their rows again."""
+        self.value = value
+        self.parts = {}       # digest -> that week's slice of base
+        self.rebuilt = 0      # weeks aggregated from rows (the rest were reused)
+        if weeks is None:
+            self.base = self._aggregate(frame)
+            self.rebuilt = frame["Week"].nunique()
+        else:
+            pieces = []
+            for rows, digest in weeks.values():
+                piece = (reuse or {}).get(digest)
+                if piece is None:
+                    piece = self._aggregate(frame.iloc[rows])
+                    self.rebuilt += 1
+                self.parts[digest] = piece
+                pieces.append(piece)
+            self.base = pd.concat(pieces) if pieces else self._aggregate(frame)
+        self._rollups = {}
+        for levels in self.ROLLUPS:
+            self.rollup(*levels)
+
+    def _aggregate(self, frame):
+        # dropna=False keeps rows with unparseable dates in the product/vendor totals
+        return frame.groupby(self.LEVELS, observed=True, dropna=False)[self.value].sum()
+
+    def rollup(self, *levels):
+        """Totals grouped by the given levels."""
+        if levels not in self._rollups:
+            self._rollups[levels] = self.base.groupby(level=list(levels), observed=True).sum()
+        return self._rollups[levels]
+
+    def within(self, level, value, by):
+        """Totals grouped by `by` for a single value of `level`, e.g. one week's vendors.
+
+        level may be a tuple of levels with a matching tuple value, e.g. ("Year", "Week"), (2025, 22).
+        """
+        levels = list(level) if isinstance(level, tuple) else [level]
+        rolled = self.rollup(*levels, by)
+        try:
+            return rolled.xs(value, level=levels if len(levels) > 1 else levels[0])
+        except KeyError:
+            return rolled.iloc[0:0].droplevel(levels)
+
+
+# ---------- Prepared Product Sheets ----------
+def _week_keys(df, week):
+    """Key columns for a week argument: ["Week"], or [year column, "Week"] for an (ISO year, week) tuple."""
+    return ["Year" if "Year" in df.columns else "year", "Week"] if isinstance(week, tuple) else ["Week"]
+
+
+def week_rows(df, week):
+    """Rows of a weekly sheet for an ISO week number or an (ISO year, week) tuple."""
+    if isinstance(week, tuple):
+        year_col = _week_keys(df, week)[0]
+        return df[(df[year_col] == week[0]) & (df["Week"] == week[1])]
+    return df[df["Week"] == week]
+
+
+_NO_ROWS = (np.empty(0, dtype=np.intp), np.empty(0))
+
+
+class WeekRanking:
+    """Row positions of a weekly sheet ordered by one metric within each week.
+
+    NaN sorts last and ties keep sheet order, so top-N, bottom-N and sign
+    filters are slices of a precomputed array instead of a filter and sort.
+    """
+
+    def __init__(self, frame, column, keys=("Week",), descending=True):
+        values = frame[column].to_numpy(dtype="float64", na_value=np.nan)
+        sort_keys = -values if descending else values   # ascending with NaN last either way
+        self.frame = frame
+        self.descending = descending
+        self._weeks = {}   # week key -> (row positions in rank order, their sort keys)
+        for key, rows in frame.groupby(list(keys), sort=False).indices.items():
+            order = np.argsort(sort_keys[rows], kind="stable")
+            key = tuple(int(k) for k in key) if isinstance(key, tuple) else int(key)
+            self._weeks[key] = (rows[order], sort_keys[rows][order])
+
+    def rows(self, week, n=None):
+        """Positions of the week's rows in rank order (the first n)."""
+        key = tuple(int(k) for k in week) if isinstance(week, tuple) else week
+        return self._weeks.get(key, _NO_ROWS)[0][:n]
+
+    def beyond(self, week, threshold):
+        """Positions of the rows ranked ahead of threshold (above it when descending, below when not)."""
+        key = tuple(int(k) for k in week) if isinstance(week, tuple) else week
+        rows, sort_keys = self._weeks.get(key, _NO_ROWS)
+        return rows[:np.searchsorted(sort_keys, -threshold if self.descending else threshold, side="left")]
+
+
+class PreparedSheet:
+    """A weekly product sheet (Organic or Media) with its product names indexed."""
+
+    def __init__(self, frame, name_col):
+        self.frame = frame
+        self.name_col = name_col
+        self.names = NameIndex(frame[name_col])
+        self._panels = {}   # id(other sheet) -> (other sheet, ChannelPanel)
+        self._rankings = {}   # (column, descending, keys, totals) -> WeekRanking
+
+    def product(self, product):
+        """Rows for one product, matched case- and punctuation-insensitively."""
+        return self.frame.iloc[self.names.rows(product)]
+
+    def product_containing(self, text):
+        return self.frame.iloc[self.names.rows_containing(text)]
+
+    def product_week(self, product, week):
+        return week_rows(self.product(product), week)
+
+    def ranking(self, column, by_year=False, descending=True, totals=False):
+        """The WeekRanking of column per week (per (year, week) with by_year), built on first use.
+
+        totals=True ranks each product's summed column per week instead of single rows.
+        """
+        keys = tuple(_week_keys(self.frame, (0, 0) if by_year else 0))
+        spec = (column, descending, keys, totals)
+        if spec not in self._rankings:
+            frame = self.frame
+            if totals:
+                frame = frame.groupby([*keys, self.name_col], observed=True)[column].sum().reset_index()
+            self._rankings[spec] = WeekRanking(frame, column, keys, descending)
+        return self._rankings[spec]
+
+    def ranked(self, week, column, n=None, descending=True):
+        """The week's rows ordered by column (the first n)."""
+        return self.frame.iloc[self.ranking(column, isinstance(week, tuple), descending).rows(week, n)]
+
+    def top_row(self, week, column, descending=True):
+        """(product name, value) of the week's highest (or lowest) value of column, or None."""
+        rows = self.ranking(column, isinstance(week, tuple), descending).rows(week, 1)
+        if not len(rows) or pd.isna(self.frame[column].iat[rows[0]]):
+            return None
+        return self.frame[self.name_col].iat[rows[0]], self.frame[column].iat[rows[0]]
+
+    def rows_beyond(self, week, column, threshold, descending=True):
+        """The week's rows with column above (or below) threshold, in sheet order."""
+        ranking = self.ranking(column, isinstance(week, tuple), descending)
+        return self.frame.iloc[np.sort(ranking.beyond(week, threshold))]
+
+    def ranked_totals(self, week, column, n=None):
+        """Each product's summed column in the week, largest first (the first n)."""
+        ranking = self.ranking(column, isinstance(week, tuple), totals=True)
+        return ranking.frame.iloc[ranking.rows(week, n)].set_index(self.name_col)[column]
+
+
+# ---------- Joined Organic–Media Panel ----------
+class ChannelPanel:
+    """Organic and Media metrics side by side per (normalized product, ISO year, week).
+
+    Every numeric column of both sheets is kept as its per-(product, year, week)
+    sum and mean, so any cross-channel comparison is one indexed lookup. A bare
+    week number means that week in every year, as in week_rows.
+    """
+
+    KEY = ["Product Key", "Year", "Week"]
+    EXCLUDED = {"Week", "Year", "year"}
+
+    def __init__(self, organic, media):
+        channels = [self._aggregate(sheet, name) for name, sheet in (("organic", organic), ("media", media))]
+        frame = pd.concat(channels, axis=1).sort_index()
+        # A product-week missing from one channel has nothing to sum or count there
+        stats = [col for col in frame.columns if col[1] in ("sum", "count")]
+        dtypes = {col: channel[col].dtype for channel in channels for col in stats if col in channel.columns}
+        self.frame = frame.fillna({col: 0 for col in stats}).astype(dtypes)
+        self._positions = {key: i for i, key in enumerate(self.frame.index)}
+        self._numbers = None   # (frame, positions) per (product, week number), built on first use
+
+    def _aggregate(self, sheet, channel):
+        df = sheet.frame
+        numeric = [c for c in df.select_dtypes("number").columns if c not in self.EXCLUDED]
+        year_col = "Year" if "Year" in df.columns else "year"
+        keys = [df[sheet.name_col].map(normalize_name).rename(self.KEY[0]),
+                df[year_col].rename(self.KEY[1]), df["Week"].rename(self.KEY[2])]
+        grouped = df.groupby(keys, dropna=True)[numeric]
+        return pd.concat({(channel, "sum"): grouped.sum(), (channel, "mean"): grouped.mean(),
+                          (channel, "count"): grouped.count()}, axis=1)
+
+    def _by_number(self):
+        """The panel summed over years per (product, week number); means are re-weighted by row counts."""
+        if self._numbers is None:
+            grouped = self.frame.groupby(level=[self.KEY[0], self.KEY[2]])
+            frame = grouped.sum()
+            for channel, stat, column in frame.columns:
+                if stat == "mean":
+                    counts = frame[(channel, "count", column)]
+                    frame[(channel, stat, column)] = (frame[(channel, "sum", column)] / counts).where(counts > 0)
+            self._numbers = (frame, {key: i for i, key in enumerate(frame.index)})
+        return self._numbers
+
+    def _source(self, product, week):
+        """(frame, position) holding one product and week number or (year, week) tuple."""
+        if isinstance(week, tuple):
+            return self.frame, self._positions.get((product, *week))
+        frame, positions = self._by_number()
+        return frame, positions.get((product, week))
+
+    def has(self, channel, column):
+        return (channel, "sum", column) in self.frame.columns
+
+    def value(self, product, week, column):
+        """One (channel, stat, column) for one product and week, as a dictionary lookup."""
+        if column not in self.frame.columns:
+            raise KeyError(column[2])
+        frame, position = self._source(normalize_name(product), week)
+        if position is None:
+            return self.frame[column].dtype.type(0) if column[1] == "sum" else np.nan
+        return frame[column].iat[position]
+
+    def lookup(self, products, weeks, columns):
+        """columns ((channel, stat, column)) for every (product, week) pair, indexed by product label.
+
+        weeks are week numbers or (year, week) tuples, and default to the week
+        numbers the products have rows in. Sums are 0 and means NaN where the
+        product has no rows that week.
+        """
+        missing = [col for col in columns if col not in self.frame.columns]
+        if missing:
+            raise KeyError(missing[0][2])
+        keys = [normalize_name(p) for p in products]
+        if weeks is None:
+            present = self.frame.index.get_level_values(0).isin(keys)
+            weeks = sorted(set(self.frame.index.get_level_values(2)[present]))
+        pairs = [(key, week) for key in keys for week in weeks]
+        dated = [i for i, (_, week) in enumerate(pairs) if isinstance(week, tuple)]
+        numbered = [i for i, (_, week) in enumerate(pairs) if not isinstance(week, tuple)]
+        parts = [self.frame[columns].reindex(pd.MultiIndex.from_tuples([(pairs[i][0], *pairs[i][1]) for i in dated]))
+                 if dated else None,
+                 self._by_number()[0][columns].reindex(pd.MultiIndex.from_tuples([pairs[i] for i in numbered]))
+                 if numbered else None]
+        picked = pd.concat([part for part in parts if part is not None] or [self.frame[columns].iloc[:0]])
+        picked = picked.iloc[np.argsort(dated + numbered, kind="stable")]
+        sums = {col: self.frame[col].dtype for col in columns if col[1] == "sum"}
+        picked = picked.fillna({col: 0 for col in sums}).astype(sums)
+        picked.index = pd.MultiIndex.from_arrays(
+            [[p for p in products for _ in weeks], pd.Index([w for _ in products for w in weeks], tupleize_cols=False)],
+            names=["Product", "Week"],
+        )
+        return picked
+
+
+def channel_panel(organic, media):
+    """The ChannelPanel of two PreparedSheets, built once per pair."""
+    cached = organic._panels.get(id(media))
+    if cached is None or cached[0] is not media:
+        cached = organic._panels[id(media)] = (media, ChannelPanel(organic, media))
+    return cached[1]
+
+
+def as_prepared_sheet(sheet, name_col):
+    """Accept either a raw Organic/Media DataFrame or an already PreparedSheet."""
+    return sheet if isinstance(sheet, PreparedSheet) else PreparedSheet(sheet, name_col)
+
+
+def prepared_sheet(dataset, sheet_name):
+    """The PreparedSheet for "Organic" or "Media", built once per workbook version."""
+    return dataset.derived(
+        ("prepared_sheet", sheet_name),
+        lambda ds: PreparedSheet(ds.sheet(sheet_name), PRODUCT_SHEETS[sheet_name]),
+    )
+
+
+def prepared_panel(dataset):
+    """The ChannelPanel of a dataset's Organic and Media sheets, built once per workbook version."""
+    return dataset.derived(
+        "channel_panel",
+        lambda ds: channel_panel(prepared_sheet(ds, "Organic"), prepared_sheet(ds, "Media")),
+    )
+
+
+def as_prepared_sales(raw_data):
+    """Accept either a raw sales DataFrame or an already PreparedSales."""
+    return raw_data if isinstance(raw_data, PreparedSales) else PreparedSales(raw_data)
+
+
+def prepared_sales(dataset):
+    """The PreparedSales for a Dataset, built once per workbook version."""
+    def build(ds):
+        return PreparedSales(
+            ds.sheet(RAW_SHEET),
+            partitions=snapshot_partitions(ds.path, ds.version, RAW_SHEET),
+            reuse=ds.reuse.pop("prepared_sales", None),
+        )
+
+    return dataset.derived("prepared_sales", build)
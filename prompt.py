@@ -1,7 +1,14 @@
+import hashlib
+import json
+
 from langchain.prompts import PromptTemplate
 
+from sql_engine import SQL_ROW_LIMIT, TABLES
+
 prompt_template = PromptTemplate(
     input_variables=["data", "question"],
+    # Static instructions first, then the per-version data, then the question:
+    # keeps the request prefix identical across calls for provider prompt caching.
     template="""
 You are **KRISPR Digital Business Analyst**, a friendly and intelligent assistant that helps analyze KRISPR's business data. You're conversational, helpful, and always provide accurate answers based on the available data.
 
@@ -79,6 +86,8 @@ When asked about specific metrics like "Avg TCS Media", "Media Share %", "Daily
 **About KRISPR:**
 Krispr is a sustainable agri-tech company revolutionizing how food is grown and delivered. Based in Dubai, they use advanced indoor farming systems to grow fresh, flavorful, and pesticide-free greens, herbs, and vegetables—right in the city, just hours before delivery.
 
+**Remember:** Be helpful, accurate, and conversational. If you need to ask for clarification, do so politely. Always base your answers on the actual data provided. For specific metrics, check the data context first and provide exact values when available.
+
 ---
 
 📥 **Available Data:**
@@ -86,7 +95,80 @@ Krispr is a sustainable agri-tech company revolutionizing how food is grown and
 
 🔎 **User Question:**
 {question}
+"""
+)
 
-**Remember:** Be helpful, accurate, and conversational. If you need to ask for clarification, do so politely. Always base your answers on the actual data provided. For specific metrics, check the data context first and provide exact values when available.
+# Asks for the one read-only query whose result answers the question (see sql_engine.py)
+sql_prompt_template = PromptTemplate(
+    input_variables=["dialect", "tables", "row_limit", "question"],
+    template="""
+You write a single read-only {dialect} query over KRISPR's business data. Its result is shown to an analyst who answers the user's question from it, so return only what is needed: aggregate, filter and sort in SQL, and keep the result under {row_limit} rows.
+
+Tables (one row per sheet row):
+{tables}
+
+Notes:
+- sales has one row per order line; iso_year, iso_week and month are derived from local_order_date (YYYY-MM-DD text).
+- organic and media have one row per product per week; week is the ISO week number and year the ISO year.
+- Product and vendor names vary in case and punctuation; match them with LOWER(...) LIKE '%word%'.
+
+Rules:
+- Exactly one SELECT (or WITH ... SELECT) statement, no comments, no semicolons.
+- Use only the tables and columns listed above.
+- Reply with the query in a ```sql block and nothing else, or reply NONE if the tables cannot answer the question.
+
+**SQL Question:**
+{question}
 """
 )
+
+# The analysis functions listed at the top of every answer prompt
+FUNCTIONS_CONTEXT = """🔧 **Available Analysis Functions:**
+
+**Sales & Units Analysis:** (a week is a week number or an (ISO year, week) tuple)
+- get_total_units_sold(raw_data, week) - Total units sold in a week
+- get_product_units_sold(raw_data, product, week) - Units sold for specific product
+- get_highest_units_sold_product(raw_data, week) - Best selling product in a week
+- get_top_vendor_by_units(raw_data, week) - Top vendor by units sold
+- compare_weekly_units_sold(raw_data, week1, week2) - Compare two weeks
+- get_units_sold_between(raw_data, start, end) - Units sold between two dates
+- get_rolling_units_sold(raw_data, n_weeks=4, week=None, product=None) - Trailing N-week totals
+- get_week_over_week_change(raw_data, week=None, product=None) - Units vs the week before
+
+**Performance Analysis:**
+- get_top_performing_product(raw_data) - Overall best product
+- get_top_n_performing_products(raw_data, n=5, week=None) - Top N products
+- get_top_vendors_by_month(raw_data, month, year=None, n=5) - Top vendors in a month
+
+**Organic vs Media Analysis:**
+- compare_organic_vs_media_units(organic, media, product, week) - Compare channels
+- get_diff_daily_sv_media_organic(organic, media, product, week) - SV difference
+- get_total_media_organic_units(organic, media, product, week) - Combined units
+- get_product_week_metrics(organic, media, products, weeks, metrics) - Many products and weeks in one table
+
+**Financial Analysis:**
+- get_total_ni_media(media, week) - Total net income in media
+- get_negative_ni_per_sku_products(media, week) - Products with negative NI
+- get_positive_ni_per_sku_products(media, week) - Products with positive NI
+
+**Share & Metrics Analysis:**
+- get_week_with_highest_daily_msv(media) - Week with highest MSV
+- get_avg_daily_osv(change, week) - Average daily OSV
+- get_top_products_by_media_units(media, week, top_n=3) - Top media products
+
+**Note:** Use these functions when you need to perform specific calculations. Always provide accurate results based on the actual data."""
+
+# The only columns the data summary reads, so a cold summary never loads whole sheets
+CONTEXT_COLUMNS = {
+    "Raw Data - Date Wise": ["Local Order Date", "Item Description", "Vendor Name", "Sold Quantity"],
+    "Organic": ["PRODUCT NAME", "Week"],
+    "Media": ["Product Name", "Week"],
+    "Overall Avg & Change": ["Week"],
+}
+
+# Changes whenever any text that goes into a prompt does (templates, functions
+# list, summarised columns, SQL tables and row limit); part of the answer cache key
+PROMPT_VERSION = hashlib.sha256("\x1f".join([
+    prompt_template.template, sql_prompt_template.template, FUNCTIONS_CONTEXT,
+    json.dumps(CONTEXT_COLUMNS, sort_keys=True), json.dumps(TABLES, sort_keys=True), str(SQL_ROW_LIMIT),
+]).encode("utf-8")).hexdigest()[:12]
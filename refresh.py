@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+
+from answer_cache import get_answer_cache
+from dataset import Dataset, cached_dataset, file_version, invalidate_dataset, read_workbook, replace_workbook
+from partitions import diff_partitions, week_digests
+from prepared_data import RANKINGS, prepared_panel, prepared_sales, prepared_sheet
+from snapshot import PARTITIONED_SHEETS, prune_snapshots, snapshot_partitions, write_snapshot
+
+# ---------- Background Workbook Refresh ----------
+# A new workbook is downloaded next to the live one under a staging name, parsed,
+# validated and fully prewarmed (snapshot, prepared data, indexes, prompt
+# context) while chats keep using the old version. Only then is it renamed over
+# the live file, so no session ever reads a half-written workbook or pays for
+# the first parse.
+
+REQUIRED_COLUMNS = {
+    "Raw Data - Date Wise": ["Local Order Date", "Item Description", "Vendor Name", "Sold Quantity"],
+    "Organic": ["Week", "PRODUCT NAME"],
+    "Media": ["Week", "Product Name"],
+    "Overall Avg & Change": ["Week"],
+}
+
+
+def validate_sheets(sheets):
+    """Problems that would stop the chatbot from using these sheets (empty when valid)."""
+    problems = []
+    for sheet, columns in REQUIRED_COLUMNS.items():
+        df = sheets.get(sheet)
+        if df is None:
+            problems.append(f"missing sheet '{sheet}'")
+            continue
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            problems.append(f"sheet '{sheet}' is missing columns: {', '.join(missing)}")
+    raw_data = sheets.get("Raw Data - Date Wise")
+    if raw_data is not None and "Local Order Date" in raw_data.columns and not raw_data["Local Order Date"].notna().any():
+        problems.append("no readable dates in 'Local Order Date'")
+    return problems
+
+
+def prewarm(dataset):
+    """Build everything the chat path derives from a dataset."""
+    from connect import get_prompt_context
+    from retrieval import retrieval_index
+    from sql_engine import sql_engine
+
+    prepared_sales(dataset).cube
+    for sheet in ("Organic", "Media"):
+        if dataset.sheet(sheet) is not None:
+            prepared = prepared_sheet(dataset, sheet)
+            for column, descending, totals in RANKINGS[sheet]:
+                if column in prepared.frame.columns:
+                    prepared.ranking(column, descending=descending, totals=totals)
+    if dataset.sheet("Organic") is not None and dataset.sheet("Media") is not None:
+        prepared_panel(dataset)
+    get_prompt_context(dataset)
+    retrieval_index(dataset)
+    sql_engine(dataset)
+
+
+def week_delta(excel_path, old_version, new_version):
+    """Which ISO weeks of the sales sheet differ between two snapshotted versions."""
+    sheet = next(iter(PARTITIONED_SHEETS))
+    old = snapshot_partitions(excel_path, old_version, sheet) if old_version else None
+    new = snapshot_partitions(excel_path, new_version, sheet)
+    if new is None:
+        return None
+    return diff_partitions(week_digests(old or []), week_digests(new))
+
+
+def _gdown(file_id, target):
+    import gdown
+
+    url = f"https://drive.google.com/uc?id={file_id}"
+    if gdown.download(url, target, quiet=True) is None:
+        raise RuntimeError("the download did not produce a file")
+
+
+def _describe(delta):
+    if not delta:
+        return ""
+    weeks = len(delta["added"]) + len(delta["changed"]) + delta["unchanged"]
+    return f" ({len(delta['added'])} new and {len(delta['changed'])} changed of {weeks} weeks)"
+
+
+class RefreshJob:
+    """Progress of one background refresh, readable from any session."""
+
+    def __init__(self, source):
+        self.source = source
+        self.status = "queued"
+        self.message = "Waiting to start"
+        self.version = None
+        self.delta = None
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def running(self):
+        return self.finished is None
+
+    def _step(self, status, message):
+        self.status, self.message = status, message
+
+
+_jobs = {}   # abs workbook path -> its most recent RefreshJob
+_job_lock = threading.Lock()
+
+
+def current_refresh(excel_path):
+    """The most recent refresh job for a workbook, or None."""
+    with _job_lock:
+        return _jobs.get(os.path.abspath(excel_path))
+
+
+def start_refresh(source, excel_path, download=_gdown):
+    """Start refreshing excel_path from source on a background thread; returns the job.
+
+    download(source, target) writes the new workbook to target (Google Drive by
+    default). If a refresh of the same workbook is already running, that job is
+    returned instead; different workbooks refresh independently.
+    """
+    with _job_lock:
+        job = _jobs.get(os.path.abspath(excel_path))
+        if job is not None and job.running:
+            return job
+        _jobs[os.path.abspath(excel_path)] = job = RefreshJob(source)
+    threading.Thread(target=_run, args=(job, excel_path, download), daemon=True,
+                     name="krispr-refresh").start()
+    return job
+
+
+def _run(job, excel_path, download):
+    excel_path = os.path.abspath(excel_path)
+    directory, name = os.path.split(excel_path)
+    download_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.download.xlsx")
+    staging_path = None
+    try:
+        job._step("downloading", "Downloading the new workbook")
+        os.makedirs(directory, exist_ok=True)   # first download of a newly registered dataset
+        download(job.source, download_path)
+
+        # Name the staged file after its content hash so concurrent or retried refreshes never collide
+        version = file_version(download_path)
+        invalidate_dataset(download_path)
+        staging_path = os.path.join(directory, f".{name}.{version}.staging.xlsx")
+        os.replace(download_path, staging_path)
+        job.version = version
+        previous = file_version(excel_path) if os.path.exists(excel_path) else None
+        if previous == version:
+            job._step("done", "The live workbook is already this version")
+            return
+
+        job._step("validating", "Parsing and validating sheets")
+        sheets = read_workbook(staging_path)
+        problems = validate_sheets(sheets)
+        if problems:
+            raise ValueError("; ".join(problems))
+
+        job._step("prewarming", "Building snapshot, indexes and prompt context")
+        # Unchanged weeks keep their stored partitions and their aggregates from the live version
+        live = cached_dataset(excel_path)
+        write_snapshot(excel_path, version, sheets, prune=False)
+        job.delta = week_delta(excel_path, live.version if live else None, version)
+        dataset = Dataset(excel_path, version, sheets, reuse=live.reusable() if live else None)
+        prewarm(dataset)
+
+        job._step("swapping", "Switching to the new workbook")
+        replace_workbook(excel_path, staging_path, dataset)
+        staging_path = None
+        # The replaced version stays on disk: datasets still serving it read unread sheets from it
+        prune_snapshots(excel_path, keep=[version, previous] if previous else version, previous=0)
+        # Only this workbook's old answers go; other datasets keep theirs
+        if previous is not None:
+            get_answer_cache().invalidate(previous)
+        job._step("done", "The new workbook is live" + _describe(job.delta))
+    except Exception as e:
+        job.error = str(e)
+        job._step("failed", f"Refresh failed: {e}")
+    finally:
+        for leftover in (download_path, staging_path):
+            if leftover and os.path.exists(leftover):
+                os.remove(leftover)
+        job.finished = time.time()
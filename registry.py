@@ -0,0 +1,96 @@
+import json
+import os
+import re
+import threading
+import time
+
+from dataset import invalidate_dataset
+
+# ---------- Dataset Registry ----------
+# The workbooks this deployment serves (brands, regions, historical snapshots),
+# by name. The list is a small JSON file so every Streamlit process and a restart
+# see the same datasets. Each workbook keeps its own parsed data, indexes and
+# answers, keyed by its path and content version (see dataset.py and
+# answer_cache.py).
+
+REGISTRY_PATH = os.environ.get("KRISPR_DATASETS", "datasets.json")
+WORKBOOK_DIR = os.environ.get("KRISPR_WORKBOOK_DIR", "workbooks")   # where registered workbooks are downloaded
+DEFAULT_DATASET = {"name": "default", "label": "KRISPR (latest)", "path": "latest_file.xlsx"}
+
+_NAME = re.compile(r"[a-z0-9][a-z0-9_-]{0,39}")
+_lock = threading.Lock()
+
+
+def _read():
+    try:
+        with open(REGISTRY_PATH, encoding="utf-8") as fh:
+            return json.load(fh).get("datasets", [])
+    except FileNotFoundError:
+        return []
+
+
+def _write(entries):
+    # Write a sibling file and rename it, so readers never see half a registry
+    tmp = f"{REGISTRY_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"datasets": entries}, fh, indent=2)
+    os.replace(tmp, REGISTRY_PATH)
+
+
+def list_datasets():
+    """[{"name", "label", "path", ...}] with the default workbook first."""
+    with _lock:
+        entries = _read()
+    if not any(entry["name"] == DEFAULT_DATASET["name"] for entry in entries):
+        entries.insert(0, dict(DEFAULT_DATASET))
+    return entries
+
+
+def get_dataset(name):
+    """The registry entry called name, or None."""
+    return next((entry for entry in list_datasets() if entry["name"] == name), None)
+
+
+def dataset_path(name):
+    """Workbook path of a registered dataset."""
+    entry = get_dataset(name)
+    if entry is None:
+        raise ValueError(f"unknown dataset '{name}'")
+    return entry["path"]
+
+
+def register_dataset(name, label=None, path=None, source=None):
+    """Add or update a dataset; its workbook defaults to WORKBOOK_DIR/<name>.xlsx. Returns the entry."""
+    name = name.strip().lower()
+    if not _NAME.fullmatch(name):
+        raise ValueError("dataset names use lowercase letters, digits, '-' and '_' (at most 40 characters)")
+    with _lock:
+        entries = _read()
+        entry = next((e for e in entries if e["name"] == name), None)
+        if entry is None:
+            default = DEFAULT_DATASET if name == DEFAULT_DATASET["name"] else {}
+            entry = {"name": name, "created": time.time()}
+            entry["path"] = path or default.get("path") or os.path.join(WORKBOOK_DIR, f"{name}.xlsx")
+            entry["label"] = default.get("label")
+            entries.append(entry)
+        elif path:
+            entry["path"] = path
+        entry["label"] = label or entry.get("label") or name
+        if source:
+            entry["source"] = source
+        _write(entries)
+    return entry
+
+
+def remove_dataset(name):
+    """Unregister a dataset and drop its cached data; the workbook file is kept."""
+    if name == DEFAULT_DATASET["name"]:
+        raise ValueError("the default dataset cannot be removed")
+    with _lock:
+        entries = _read()
+        entry = next((e for e in entries if e["name"] == name), None)
+        if entry is None:
+            return False
+        _write([e for e in entries if e["name"] != name])
+    invalidate_dataset(entry["path"])
+    return True
@@ -0,0 +1,107 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------- Coalesced, Bounded LLM Execution ----------
+# Every Streamlit session runs in its own script thread. LLM work is handed to
+# one process-wide pool instead: at most MAX_CONCURRENT_LLM generations run at
+# once, the rest wait in FIFO order, and sessions asking the same question on
+# the same workbook share a single generation.
+
+MAX_CONCURRENT_LLM = int(os.environ.get("KRISPR_LLM_CONCURRENCY", 4))
+
+
+class SharedStream:
+    """Chunks of one in-flight generation, replayable by every session waiting on it."""
+
+    def __init__(self):
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._cond = threading.Condition()
+
+    def publish(self, chunk):
+        with self._cond:
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._cond.notify_all()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._done:
+                    self._cond.wait()
+                pending = self._chunks[index:]
+                done, error = self._done, self._error
+            yield from pending
+            index += len(pending)
+            if done and index >= len(self._chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class RequestPool:
+    """Runs token generators on a bounded pool, collapsing identical in-flight requests."""
+
+    def __init__(self, max_workers=MAX_CONCURRENT_LLM):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="krispr-llm")
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, "coalesced": 0}
+        self._queued = 0
+
+    def stream(self, key, produce):
+        """Yield the chunks of produce(), sharing one run among callers with the same key."""
+        with self._lock:
+            shared = self._inflight.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._inflight[key] = SharedStream()
+                self._stats["started"] += 1
+                self._queued += 1
+            else:
+                self._stats["coalesced"] += 1
+        if leader:
+            self._pool.submit(self._run, key, shared, produce)
+        yield from shared
+
+    def _run(self, key, shared, produce):
+        with self._lock:
+            self._queued -= 1
+        try:
+            for chunk in produce():
+                shared.publish(chunk)
+            shared.finish()
+        except Exception as e:
+            shared.finish(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "in_flight": len(self._inflight),
+                "queued": self._queued,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_request_pool():
+    """The process-wide RequestPool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RequestPool()
+        return _pool
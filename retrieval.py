@@ -0,0 +1,196 @@
+import math
+import os
+
+import pandas as pd
+
+from intents import Question
+from name_index import stem_token, normalize_name
+from prepared_data import prepared_sales
+
+# ---------- Question-Aware Data Retrieval ----------
+# Every row of the Organic, Media and "Overall Avg & Change" sheets, plus weekly
+# per-product and per-vendor sales totals, becomes a small document indexed by
+# its sheet, product/vendor, week and column names. For each question a BM25
+# search picks the best rows, prunes them to the relevant columns and renders
+# them as compact tables within a fixed token budget.
+
+TOKEN_BUDGET = int(os.environ.get("KRISPR_RETRIEVAL_TOKENS", 600))
+K1, B = 1.5, 0.75
+
+ENGLISH_STOPWORDS = set("""
+a an and are as at be by can did do does for from give had has have how i in is it me my of on or
+our please show tell that the their there these this to us was we what when where which who with you
+""".split())
+
+RETRIEVAL_SHEETS = ["Organic", "Media", "Overall Avg & Change"]
+KEY_COLUMNS = {"Week", "Year", "year", "PRODUCT NAME", "Product Name", "Item Description", "Vendor Name"}
+
+
+def _terms(text):
+    return [stem_token(t) for t in normalize_name(text).split() if t not in ENGLISH_STOPWORDS]
+
+
+def _week_term(week):
+    return f"w{int(week)}"
+
+
+def _year_term(year):
+    return f"y{int(year)}"
+
+
+class _Doc:
+    __slots__ = ("sheet", "row", "terms")
+
+    def __init__(self, sheet, row, terms):
+        self.sheet = sheet
+        self.row = row
+        self.terms = terms
+
+
+class RetrievalIndex:
+    """BM25 over row-level documents from one dataset version."""
+
+    def __init__(self, tables):
+        self.tables = tables          # sheet label -> DataFrame the documents point into
+        self.docs = []
+        self._postings = {}           # term -> {doc id: term frequency}
+        self._column_terms = {
+            sheet: {col: set(_terms(col)) for col in df.columns if col not in KEY_COLUMNS}
+            for sheet, df in tables.items()
+        }
+        for sheet, df in tables.items():
+            self._add_sheet(sheet, df)
+        self._avg_len = sum(len(d.terms) for d in self.docs) / max(1, len(self.docs))
+        self._norms = [K1 * (1 - B + B * len(d.terms) / self._avg_len) for d in self.docs]
+        self._idf = {
+            term: math.log(1 + (len(self.docs) - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self._postings.items()
+        }
+
+    def _add_sheet(self, sheet, df):
+        shared = _terms(sheet) + [t for terms in self._column_terms[sheet].values() for t in terms]
+        name_cols = [c for c in df.columns if c in KEY_COLUMNS and c not in ("Week", "Year", "year")]
+        weeks = df["Week"].tolist() if "Week" in df.columns else [None] * len(df)
+        year_col = next((c for c in ("Year", "year") if c in df.columns), None)
+        years = df[year_col].tolist() if year_col else [None] * len(df)
+        names = [df[c].astype(str).tolist() for c in name_cols]
+        for row in range(len(df)):
+            terms = list(shared)
+            if pd.notna(weeks[row]):
+                terms.append(_week_term(weeks[row]))
+            if pd.notna(years[row]):
+                terms.append(_year_term(years[row]))
+            for values in names:
+                terms.extend(_terms(values[row]))
+            self._add(_Doc(sheet, row, terms))
+
+    def _add(self, doc):
+        doc_id = len(self.docs)
+        self.docs.append(doc)
+        for term in doc.terms:
+            postings = self._postings.setdefault(term, {})
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+
+    def search(self, question, limit=50):
+        """Documents ranked by BM25 against the question's terms."""
+        q = Question(question, None)
+        weeks = {_week_term(w) for w in q.weeks}
+        years = {_year_term(y) for y in q.years}
+        content = [t for t in _terms(question) if not t.isdigit()]
+        scores, matched_content = {}, set()
+        for term in content + sorted(weeks) * 2:   # a named week should dominate
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for doc_id, tf in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + self._norms[doc_id])
+            if term not in weeks:
+                matched_content.update(postings)
+        if weeks:
+            scores = {d: s for d, s in scores.items() if weeks & set(self.docs[d].terms)}
+        if years:
+            # The same week number recurs every year: keep rows of the years asked about
+            scores = {d: s for d, s in scores.items() if years & set(self.docs[d].terms)}
+        # Rows that only share the week number with the question are noise
+        if matched_content & set(scores):
+            scores = {d: s for d, s in scores.items() if d in matched_content}
+        ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [self.docs[d] for d in ranked]
+
+    def columns_for(self, sheet, question, limit=6):
+        """Key columns plus the metric columns whose names the question mentions."""
+        df = self.tables[sheet]
+        query = set(_terms(question))
+        scored = []
+        for col, terms in self._column_terms[sheet].items():
+            if terms:
+                overlap = len(query & terms) / len(terms)
+                if overlap >= 0.5:
+                    scored.append((overlap, col))
+        wanted = {col for _, col in sorted(scored, reverse=True)[:limit]}
+        if not wanted:
+            wanted = set(self._column_terms[sheet])
+        return [c for c in df.columns if c in KEY_COLUMNS or c in wanted]
+
+    def context(self, question, token_budget=TOKEN_BUDGET):
+        """The most relevant rows and columns for question, rendered within token_budget."""
+        docs = self.search(question)
+        if not docs:
+            return ""
+        budget = token_budget * 4   # ~4 characters per token
+        by_sheet, order, used = {}, [], 0
+        columns = {}
+        for doc in docs:
+            if doc.sheet not in columns:
+                columns[doc.sheet] = self.columns_for(doc.sheet, question)
+                header = f"\n**{doc.sheet}** ({' | '.join(columns[doc.sheet])})\n"
+                if used + len(header) > budget:
+                    continue
+                used += len(header)
+                order.append(doc.sheet)
+                by_sheet[doc.sheet] = [header]
+            if doc.sheet not in by_sheet:
+                continue
+            values = self.tables[doc.sheet].iloc[doc.row][columns[doc.sheet]]
+            line = " | ".join(_fmt(v) for v in values) + "\n"
+            if used + len(line) > budget:
+                break
+            used += len(line)
+            by_sheet[doc.sheet].append(line)
+        return "".join("".join(by_sheet[sheet]) for sheet in order).strip()
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return "" if math.isnan(value) else f"{value:.4g}"
+    text = str(value)
+    return text if len(text) <= 60 else text[:60].rstrip() + "…"
+
+
+def _sales_tables(dataset):
+    """Weekly Sold Quantity per product and per vendor, from the aggregate cube.
+
+    Weeks are keyed by (ISO year, week) like the PreparedSales partitions, so
+    week 22 of two years stays two rows.
+    """
+    cube = prepared_sales(dataset).cube
+    tables = {}
+    for label, level in (("Weekly Product Sales", "Item Description"), ("Weekly Vendor Sales", "Vendor Name")):
+        rolled = cube.rollup("Year", "Week", level).reset_index()
+        tables[label] = rolled.rename(columns={"Sold Quantity": "Units Sold"}).astype({level: str})
+    return tables
+
+
+def retrieval_index(dataset):
+    """The RetrievalIndex for a dataset, built once per workbook version."""
+    def build(ds):
+        tables = {sheet: ds.sheet(sheet) for sheet in RETRIEVAL_SHEETS if ds.sheet(sheet) is not None}
+        tables.update(_sales_tables(ds))
+        return RetrievalIndex(tables)
+
+    return dataset.derived("retrieval_index", build)
+
+
+def relevant_context(question, dataset, token_budget=TOKEN_BUDGET):
+    return retrieval_index(dataset).context(question, token_budget)
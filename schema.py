@@ -0,0 +1,109 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+# ---------- Load-time Schema Normalization ----------
+# read_excel returns object columns for every text field and 64-bit numbers for
+# every metric. Text that repeats (product, vendor and store names) becomes
+# categorical, and integer columns are narrowed when their values leave plenty
+# of headroom for the sums and differences the business logic computes. Floats
+# keep float64 so no reported figure changes.
+
+CATEGORY_MAX_RATIO = 0.5   # text with at most this many distinct values per row becomes categorical
+INT_HEADROOM = 1 << 8      # narrowed ints keep values this many times below the int32 limit
+# Only int64 -> int32: int8/int16 overflow too easily in row-wise arithmetic (e.g. org + media units)
+INT_TARGET = np.dtype("int32")
+
+
+def _fits_int32(series):
+    limits = np.iinfo(INT_TARGET)
+    return len(series) == 0 or (
+        limits.min // INT_HEADROOM <= series.min() and series.max() <= limits.max // INT_HEADROOM
+    )
+
+
+def normalize_frame(df):
+    """df with repeated text as categoricals and integers narrowed; other columns are shared, not copied."""
+    changes = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        # Object columns count as text only when every value is a string (not e.g. "% Change" mixes)
+        if pd.api.types.is_string_dtype(series.dropna() if series.dtype == object else series.dtype):
+            if series.nunique() <= CATEGORY_MAX_RATIO * len(series):
+                changes[col] = series.astype("category")
+        elif pd.api.types.is_signed_integer_dtype(series.dtype) and series.dtype.itemsize > INT_TARGET.itemsize:
+            if _fits_int32(series):
+                changes[col] = series.astype(INT_TARGET)
+    if not changes:
+        return df
+    df = df.copy(deep=False)
+    for col, series in changes.items():
+        df[col] = series
+    return df
+
+
+def sheet_memory(df):
+    """Bytes held by a sheet, strings included."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+MEMORY_SAMPLE = 64   # containers longer than this are measured from a sample of their items
+
+
+def object_memory(value, depth=4, seen=None):
+    """Approximate bytes held by a derived object: its frames, arrays, strings and containers,
+    a few attribute levels deep. Objects reached twice (e.g. a sheet shared by two indexes) count once."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return sheet_memory(value)
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes, int, float)) or value is None:
+        return sys.getsizeof(value)
+    if hasattr(value, "memory_bytes"):
+        return value.memory_bytes()
+    if depth == 0:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        items = list(value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+    elif hasattr(value, "__dict__"):
+        items = list(vars(value).values())
+    else:
+        return sys.getsizeof(value)
+    sample = items[:MEMORY_SAMPLE]
+    measured = sum(object_memory(item, depth - 1, seen) for item in sample)
+    return sys.getsizeof(value) + (measured * len(items) // len(sample) if sample else 0)
+
+
+def normalize_sheets(sheets):
+    """Normalize every sheet; returns the new sheets and a per-sheet memory report."""
+    normalized, report = {}, []
+    for name, df in sheets.items():
+        before = sheet_memory(df)
+        normalized[name] = normalize_frame(df)
+        report.append({
+            "sheet": name, "rows": len(df), "before_bytes": before,
+            "after_bytes": sheet_memory(normalized[name]),
+        })
+    return normalized, report
+
+
+def memory_report(sheets):
+    """[{"sheet", "rows", "bytes", "categorical"}] for already loaded sheets."""
+    return [
+        {
+            "sheet": name, "rows": len(df), "bytes": sheet_memory(df),
+            "categorical": sum(isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes),
+        }
+        for name, df in sheets.items()
+    ]
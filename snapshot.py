@@ -0,0 +1,248 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import pandas as pd
+
+from partitions import digest_rows, partition_rows
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - snapshots are simply skipped without pyarrow
+    pa = None
+    feather = None
+
+# ---------- Columnar Workbook Snapshots ----------
+# The xlsx stays the source of truth. Each version of it gets a sibling directory
+# "<file>.snapshot/<version>/" holding one uncompressed Feather file per sheet, which
+# worker processes memory-map instead of running openpyxl again.
+
+MANIFEST = "manifest.json"
+# Shared by all versions: one file per week partition, named by its content digest
+PARTS_DIR = "parts"
+# Sheets stored as ISO-week partitions, and the date column that partitions them
+PARTITIONED_SHEETS = {"Raw Data - Date Wise": "Local Order Date"}
+# Older versions kept when pruning: sessions may still read unread sheets of the version they started on
+KEEP_PREVIOUS = 1
+
+
+def snapshot_root(xlsx_path):
+    return os.path.abspath(xlsx_path) + ".snapshot"
+
+
+def snapshot_path(xlsx_path, version):
+    return os.path.join(snapshot_root(xlsx_path), version)
+
+
+def snapshots_available():
+    return feather is not None
+
+
+def has_snapshot(xlsx_path, version):
+    return os.path.exists(os.path.join(snapshot_path(xlsx_path, version), MANIFEST))
+
+
+def _write_sheet(df, target_dir, index):
+    """Write one sheet as Feather, falling back to pickle for mixed-type columns."""
+    return _write_frame(df, os.path.join(target_dir, f"{index:02d}"))
+
+
+def _write_frame(df, base):
+    if feather is not None:
+        try:
+            feather.write_feather(df, base + ".feather", compression="uncompressed")
+            return os.path.basename(base) + ".feather"
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. "% Change" columns mixing floats and "–128.02%" strings
+            pass
+    df.to_pickle(base + ".pkl")
+    return os.path.basename(base) + ".pkl"
+
+
+def _write_parts(df, date_col, root):
+    """Store df as one partition per ISO week under root/parts; partitions already stored are reused.
+
+    The stored sheet is in (year, week) order, rows of a week in sheet order.
+    Returns the manifest entries and the number of partitions actually written.
+    """
+    parts_dir = os.path.join(root, PARTS_DIR)
+    os.makedirs(parts_dir, exist_ok=True)
+    existing = {os.path.splitext(name)[0]: name for name in os.listdir(parts_dir) if not name.startswith(".")}
+    entries, written = [], 0
+    for key, rows in partition_rows(df, date_col):
+        part = df.take(rows).reset_index(drop=True)
+        digest = digest_rows(part)
+        name = existing.get(digest)
+        if name is None:
+            # Write under a private name first so readers never map half a file
+            tmp_base = os.path.join(parts_dir, f".{digest}-{os.getpid()}-{threading.get_ident()}")
+            tmp_name = _write_frame(part, tmp_base)
+            written_name = digest + os.path.splitext(tmp_name)[1]
+            os.replace(os.path.join(parts_dir, tmp_name), os.path.join(parts_dir, written_name))
+            name = existing[digest] = written_name
+            written += 1
+        entries.append({"key": list(key) if key else None, "rows": len(rows), "digest": digest, "file": name})
+    return entries, written
+
+
+def write_snapshot(xlsx_path, version, sheets, prune=True):
+    """Persist already-parsed sheets as the snapshot for this version of xlsx_path.
+
+    prune=False keeps older versions, e.g. while a new file is staged but not yet live.
+    """
+    if feather is None or has_snapshot(xlsx_path, version):
+        return
+    root = snapshot_root(xlsx_path)
+    os.makedirs(root, exist_ok=True)
+
+    # Build in a private directory and rename it into place so readers never see half a snapshot
+    tmp_dir = tempfile.mkdtemp(prefix=f".{version}-", dir=root)
+    try:
+        entries = []
+        for index, (name, df) in enumerate(sheets.items()):
+            date_col = PARTITIONED_SHEETS.get(name)
+            if date_col is not None and date_col in df.columns:
+                parts, _ = _write_parts(df, date_col, root)
+                entry = {"sheet": name, "parts": parts}
+                if not parts:
+                    # No rows, so no partitions: keep the empty sheet for its columns and dtypes
+                    entry["file"] = _write_sheet(df, tmp_dir, index)
+                entries.append(entry)
+            else:
+                entries.append({"sheet": name, "file": _write_sheet(df, tmp_dir, index)})
+        with open(os.path.join(tmp_dir, MANIFEST), "w", encoding="utf-8") as fh:
+            json.dump({"version": version, "sheets": entries}, fh)
+        os.rename(tmp_dir, snapshot_path(xlsx_path, version))
+    except OSError:
+        # Another process installed the same version first, or the disk is read-only
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+    if prune:
+        prune_snapshots(xlsx_path, keep=version)
+
+
+def build_snapshot(xlsx_path):
+    """Convert xlsx_path into a snapshot once; a no-op if this version already has one."""
+    from dataset import file_version, read_workbook
+
+    version = file_version(xlsx_path)
+    if not has_snapshot(xlsx_path, version):
+        write_snapshot(xlsx_path, version, read_workbook(xlsx_path))
+    return version
+
+
+def read_manifest(xlsx_path, version):
+    """The manifest of this version's snapshot, or None if there isn't one."""
+    try:
+        with open(os.path.join(snapshot_path(xlsx_path, version), MANIFEST), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_partitions(xlsx_path, version, sheet):
+    """Partition entries ({"key", "rows", "digest", "file"}) of a partitioned sheet, or None."""
+    manifest = read_manifest(xlsx_path, version)
+    for entry in (manifest or {}).get("sheets", []):
+        if entry["sheet"] == sheet:
+            return entry.get("parts")
+    return None
+
+
+def _read_frame(path, columns=None):
+    if path.endswith(".feather"):
+        return feather.read_table(path, columns=columns, memory_map=True)
+    frame = pd.read_pickle(path)
+    return frame if columns is None else frame[columns]
+
+
+def _frame_columns(path):
+    if path.endswith(".feather"):
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).schema.names
+    return list(pd.read_pickle(path).columns)
+
+
+def _read_parts(parts, parts_dir, columns=None):
+    if not parts:
+        return pd.DataFrame(columns=columns or [])
+    frames = [_read_frame(os.path.join(parts_dir, part["file"]), columns) for part in parts]
+    if frames and all(isinstance(f, pa.Table) for f in frames):
+        # Zero-copy concatenation of the memory-mapped partitions, then one conversion
+        return pa.concat_tables(frames, promote_options="permissive").to_pandas(split_blocks=True)
+    frames = [f.to_pandas() if isinstance(f, pa.Table) else f for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _sheet_entry(manifest, sheet):
+    return next((entry for entry in manifest["sheets"] if entry["sheet"] == sheet), None)
+
+
+def snapshot_sheet_names(xlsx_path, version):
+    """Sheet names stored in this version's snapshot, or None if there isn't one."""
+    manifest = read_manifest(xlsx_path, version) if feather is not None else None
+    return None if manifest is None else [entry["sheet"] for entry in manifest["sheets"]]
+
+
+def snapshot_columns(xlsx_path, version, sheet):
+    """Column names of one stored sheet, read from the file schema without loading rows."""
+    entry = _sheet_entry(read_manifest(xlsx_path, version) or {"sheets": []}, sheet)
+    if entry is None:
+        return None
+    if entry.get("parts") or "file" not in entry:
+        if not entry["parts"]:
+            return []
+        return _frame_columns(os.path.join(snapshot_root(xlsx_path), PARTS_DIR, entry["parts"][0]["file"]))
+    return _frame_columns(os.path.join(snapshot_path(xlsx_path, version), entry["file"]))
+
+
+def load_snapshot_sheet(xlsx_path, version, sheet, columns=None):
+    """Memory-map one sheet of the snapshot (only the given columns), or None if it isn't stored."""
+    manifest = read_manifest(xlsx_path, version) if feather is not None else None
+    entry = _sheet_entry(manifest, sheet) if manifest is not None else None
+    if entry is None:
+        return None
+    columns = list(columns) if columns is not None else None
+    if entry.get("parts") or "file" not in entry:
+        return _read_parts(entry["parts"], os.path.join(snapshot_root(xlsx_path), PARTS_DIR), columns)
+    frame = _read_frame(os.path.join(snapshot_path(xlsx_path, version), entry["file"]), columns)
+    return frame.to_pandas(split_blocks=True) if isinstance(frame, pa.Table) else frame
+
+
+def load_snapshot(xlsx_path, version):
+    """Memory-map the snapshot for this version, or return None if there isn't one."""
+    names = snapshot_sheet_names(xlsx_path, version)
+    if names is None:
+        return None
+    return {name: load_snapshot_sheet(xlsx_path, version, name) for name in names}
+
+
+def prune_snapshots(xlsx_path, keep, previous=KEEP_PREVIOUS):
+    """Remove snapshots of older versions of the workbook, and partitions only they used.
+
+    keep is the live version (or a list of versions) and is never removed; the
+    `previous` most recently written other versions stay too, because Datasets
+    still serving them read their sheets lazily, on first access.
+    """
+    root = snapshot_root(xlsx_path)
+    if not os.path.isdir(root):
+        return
+    kept = [keep] if isinstance(keep, str) else list(keep)
+    older = [name for name in os.listdir(root)
+             if name not in kept and name != PARTS_DIR and not name.startswith(".")]
+    older.sort(key=lambda name: os.path.getmtime(os.path.join(root, name)), reverse=True)
+    kept += older[:previous]
+    for name in older[previous:]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    parts_dir = os.path.join(root, PARTS_DIR)
+    if os.path.isdir(parts_dir):
+        used = set()
+        for version in kept:
+            manifest = read_manifest(xlsx_path, version) or {"sheets": []}
+            used.update(part["file"] for entry in manifest["sheets"] for part in entry.get("parts", []))
+        for name in os.listdir(parts_dir):
+            if name not in used and not name.startswith("."):
+                os.remove(os.path.join(parts_dir, name))
@@ -0,0 +1,197 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # pragma: no cover - SQLite (standard library) is used instead
+    duckdb = None
+
+# ---------- Embedded SQL over the Workbook ----------
+# The four sheets are loaded once per workbook version into an in-process SQL
+# engine. For questions no local intent covers, the LLM writes one read-only
+# query; it is validated, run here with a time and row limit, and only the small
+# result goes back into the answer prompt instead of the raw rows.
+
+SQL_ENGINE = os.environ.get("KRISPR_SQL_ENGINE", "sqlite")   # "sqlite", "duckdb" or "off"
+SQL_ROW_LIMIT = int(os.environ.get("KRISPR_SQL_ROW_LIMIT", 50))
+SQL_TIMEOUT = float(os.environ.get("KRISPR_SQL_TIMEOUT", 2))
+
+# sheet -> table name
+TABLES = {
+    "Raw Data - Date Wise": "sales",
+    "Organic": "organic",
+    "Media": "media",
+    "Overall Avg & Change": "weekly_change",
+}
+
+
+class SQLError(ValueError):
+    """A generated query was rejected or failed to run."""
+
+
+def column_name(name):
+    """A sheet header as a plain SQL identifier, e.g. "Org Units sold" -> org_units_sold."""
+    name = re.sub(r"[^0-9a-z]+", "_", str(name).lower()).strip("_") or "column"
+    return "_" + name if name[0].isdigit() else name
+
+
+def _table_frame(sheet, df):
+    """The sheet with identifier column names, text and dates as plain values, plus ISO week parts for sales."""
+    columns, seen = [], {}
+    for col in df.columns:
+        name = column_name(col)
+        seen[name] = seen.get(name, 0) + 1
+        columns.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    frame = df.set_axis(columns, axis=1)
+    changes = {}
+    for col in frame.columns:
+        series = frame[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            changes[col] = series.astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            changes[col] = series.dt.strftime("%Y-%m-%d")
+        elif series.dtype == object and not pd.api.types.is_string_dtype(series.dropna()):
+            changes[col] = series.map(lambda v: v if v is None or isinstance(v, (int, float)) else str(v))
+    if sheet == "Raw Data - Date Wise" and "local_order_date" in frame.columns:
+        dates = pd.to_datetime(frame["local_order_date"], errors="coerce")
+        iso = dates.dt.isocalendar()
+        changes.update(iso_year=iso["year"], iso_week=iso["week"], month=dates.dt.month)
+    return frame.assign(**changes)
+
+
+def _sql_type(series):
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series.dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def clean_query(text):
+    """The single SELECT statement in an LLM reply (fenced or bare), or SQLError."""
+    match = re.search(r"```(?:sql)?\s*(.*?)```", text, re.S | re.I)
+    sql = (match.group(1) if match else text).strip().rstrip(";").strip()
+    # Look at the statement with string literals and comments blanked out
+    bare = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    if "--" in bare or "/*" in bare:
+        raise SQLError("comments are not allowed in the query")
+    if not sql:
+        raise SQLError("the reply contained no query")
+    if ";" in bare:
+        raise SQLError("only a single statement is allowed")
+    if not re.match(r"(select|with)\b", bare, re.I):
+        raise SQLError("only SELECT queries are allowed")
+    return sql
+
+
+class SQLiteEngine:
+    """The sheets as tables of a private in-memory SQLite database that only allows reads."""
+
+    dialect = "SQLite"
+    _ALLOWED = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+    def __init__(self, sheets):
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self.tables = {}
+        for sheet, table in TABLES.items():
+            if sheets.get(sheet) is not None:
+                frame = _table_frame(sheet, sheets[sheet])
+                frame.to_sql(table, self._conn, index=False)
+                self.tables[table] = [(col, _sql_type(frame[col])) for col in frame.columns]
+        pages, page_size = (self._conn.execute(f"PRAGMA {name}").fetchone()[0] for name in ("page_count", "page_size"))
+        self._bytes = pages * page_size
+        self._conn.execute("PRAGMA query_only = ON")
+        self._conn.set_authorizer(self._authorize)
+
+    def memory_bytes(self):
+        """Bytes of the in-memory database (read-only, so measured once at build time)."""
+        return self._bytes
+
+    def _authorize(self, action, *args):
+        return sqlite3.SQLITE_OK if action in self._ALLOWED else sqlite3.SQLITE_DENY
+
+    def query(self, sql, limit=SQL_ROW_LIMIT, timeout=SQL_TIMEOUT):
+        """(DataFrame of at most limit rows, whether more rows were cut off)."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._conn.set_progress_handler(lambda: time.monotonic() > deadline, 10_000)
+            try:
+                cursor = self._conn.execute(sql)
+                rows = cursor.fetchmany(limit + 1)
+                columns = [d[0] for d in cursor.description or []]
+                cursor.close()
+            except sqlite3.Error as e:
+                raise SQLError("query timed out" if time.monotonic() > deadline else str(e)) from e
+            finally:
+                self._conn.set_progress_handler(None, 0)
+        return pd.DataFrame(rows[:limit], columns=columns), len(rows) > limit
+
+
+class DuckDBEngine:
+    """The sheets registered as zero-copy views in an in-memory DuckDB without file or network access."""
+
+    dialect = "DuckDB"
+
+    def __init__(self, sheets):
+        self._conn = duckdb.connect(":memory:")
+        self._lock = threading.Lock()
+        self.tables = {}
+        for sheet, table in TABLES.items():
+            if sheets.get(sheet) is not None:
+                frame = _table_frame(sheet, sheets[sheet])
+                self._conn.register(table, frame)
+                self.tables[table] = [(col, _sql_type(frame[col])) for col in frame.columns]
+        self._conn.execute("SET enable_external_access = false")
+        self._conn.execute("SET lock_configuration = true")
+
+    def query(self, sql, limit=SQL_ROW_LIMIT, timeout=SQL_TIMEOUT):
+        statements = self._conn.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise SQLError("only a single SELECT statement is allowed")
+        with self._lock:
+            timer = threading.Timer(timeout, self._conn.interrupt)
+            timer.start()
+            try:
+                result = self._conn.execute(sql)
+                rows = result.fetchmany(limit + 1)
+                columns = [d[0] for d in result.description or []]
+            except duckdb.Error as e:
+                raise SQLError(str(e)) from e
+            finally:
+                timer.cancel()
+        return pd.DataFrame(rows[:limit], columns=columns), len(rows) > limit
+
+
+ENGINES = {"sqlite": SQLiteEngine, "duckdb": DuckDBEngine}
+
+
+def sql_engine(dataset):
+    """The SQL engine over a Dataset's sheets, built once per version; None when disabled."""
+    name = SQL_ENGINE.lower()
+    if name in ("", "off", "none", "0"):
+        return None
+    if name == "duckdb" and duckdb is None:
+        name = "sqlite"
+    return dataset.derived(
+        "sql_engine", lambda ds: ENGINES[name]({sheet: ds.sheet(sheet) for sheet in TABLES if ds.has_sheet(sheet)})
+    )
+
+
+def describe_tables(engine):
+    """One line per table, "name(column TYPE, ...)", for the query prompt."""
+    return "\n".join(
+        f"{table}({', '.join(f'{col} {kind}' for col, kind in columns)})" for table, columns in engine.tables.items()
+    )
+
+
+def format_result(sql, frame, truncated):
+    """The query and its result as compact text for the answer prompt."""
+    text = frame.to_string(index=False, max_colwidth=80) if len(frame) else "(no rows)"
+    note = f"\n(first {len(frame)} rows shown)" if truncated else ""
+    return f"Query:\n{sql}\n\nResult:\n{text}{note}"
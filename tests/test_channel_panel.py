@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import business_logic as bl
+from benchmarks.synthetic_workbook import generate_sheets
+from prepared_data import PreparedSheet, week_rows
+
+PRODUCT = "Krispr Premium Thyme, 25g"
+
+
+@pytest.fixture(scope="module")
+def sheets():
+    # 60 weeks from 2024-W49: weeks 1-8 and 49-52 occur in two ISO years
+    sheets = generate_sheets(2000, weeks=60)
+    return PreparedSheet(sheets["Organic"], "PRODUCT NAME"), PreparedSheet(sheets["Media"], "Product Name")
+
+
+def _rows(sheet, week):
+    df = week_rows(sheet.frame, week)
+    return df[df[sheet.name_col] == PRODUCT]
+
+
+@pytest.mark.parametrize("week", [(2025, 1), (2026, 1), 1, (2025, 30), 30])
+def test_product_week_metrics_match_the_sheet_rows(sheets, week):
+    organic, media = sheets
+    frame = bl.get_product_week_metrics(organic, media, [PRODUCT], [week], ["media_units", "org_share"])
+    assert frame["Week"].tolist() == [week]
+    assert frame["media_units"].iloc[0] == _rows(media, week)["Media Units Sold"].sum()
+    assert np.isclose(frame["org_share"].iloc[0], _rows(organic, week)["Organic Share of Sales %"].mean())
+
+
+def test_tuple_weeks_do_not_mix_years(sheets):
+    organic, media = sheets
+    assert len(_rows(organic, (2025, 1))) and len(_rows(organic, (2026, 1)))
+    org_share, media_share = bl.compare_media_organic_share(organic, media, PRODUCT, (2026, 1))
+    assert org_share == pytest.approx(_rows(organic, (2026, 1))["Organic Share of Sales %"].mean())
+    assert media_share == pytest.approx(_rows(media, (2026, 1))["Media Share %"].mean())
+    assert np.isnan(bl.compare_media_organic_share(organic, media, PRODUCT, (2023, 1))[0])
+
+
+def test_mixed_week_kinds_keep_the_requested_order(sheets):
+    organic, media = sheets
+    weeks = [(2026, 1), 30, (2025, 1), 1]
+    frame = bl.get_product_week_metrics(organic, media, [PRODUCT, "Krispr Premium Rosemary, 40g"], weeks,
+                                        ["media_units"])
+    assert frame["Week"].tolist() == weeks * 2
+    assert frame["media_units"].iloc[:4].tolist() == [_rows(media, w)["Media Units Sold"].sum() for w in weeks]
@@ -0,0 +1,49 @@
+import pytest
+
+from benchmarks.synthetic_workbook import generate_sheets
+from dataset import Dataset
+from intents import answer_locally
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return Dataset("synthetic.xlsx", "v1", generate_sheets(5000, weeks=8, start="2025-05-19"))
+
+
+@pytest.mark.parametrize("question", [
+    "top 5 products last week",
+    "top 5 products in june",
+    "top 3 products at dubai marina",
+    "best selling product at Dubai Marina",
+    "worst product last week",
+    "top 3 products by cogs in week 22",
+])
+def test_qualified_product_rankings_go_to_the_llm(dataset, question):
+    assert answer_locally(question, dataset) is None
+
+
+def test_top_products_by_media_units_come_from_the_media_sheet(dataset):
+    assert answer_locally("top 3 products by media units in week 22", dataset).startswith("📣 Top 3 products by media")
+
+
+@pytest.mark.parametrize("question", [
+    "how many units were sold in week 22 on average",
+    "how many units per vendor were sold in week 22",
+    "what percentage of units were sold in week 22",
+    "total units sold in week 22 excluding dubai marina",
+    "how many units did each vendor sell in week 22",
+    "how many units were sold last week",
+    "total units sold in week 22 2024 vs 2025",
+])
+def test_modified_units_questions_go_to_the_llm(dataset, question):
+    assert answer_locally(question, dataset) is None
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("top 3 products in week 22", "🏆 Top 3 products by units sold in Week 22"),
+    ("best selling product", "🏆 The best-selling product overall"),
+    ("worst product", "📉 The lowest-selling product overall"),
+    ("total units sold in week 22", "📦 Total units sold in Week 22"),
+])
+def test_plain_questions_are_answered_locally(dataset, question, answer):
+    assert answer_locally(question, dataset).startswith(answer)
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from name_index import NameIndex, product_title
+
+THYME = "Krispr Premium Thyme, 25g"
+BASIL = "Nutritional Benefits:\\n\\n• Basil is a good source of vitamins\\n• Pairs well with thyme and tomatoes"
+TOMATOES = "Krispr Baby Plum Tomatoes - UAE, 300g"
+
+
+def _index():
+    return NameIndex(pd.Series([THYME, BASIL, TOMATOES, THYME]))
+
+
+def test_product_title_skips_headings_and_descriptions():
+    assert product_title(THYME) == THYME
+    assert product_title(BASIL) == "Basil is a good source of vitamins"
+    assert product_title("Juicy tomatoes. Low in calories.") == "Juicy tomatoes."
+
+
+def test_description_words_do_not_match_names():
+    index = _index()
+    assert index.find_in(["thyme"])[0] == THYME
+    assert index.find_in(["tomatoes"])[0] == TOMATOES
+    assert index.resolve("basil") == BASIL
+
+
+def test_lookups_fall_back_to_the_resolved_name():
+    index = _index()
+    assert list(index.rows("thyme")) == [0, 3]
+    assert index.labels("baby tomato") == [TOMATOES]
+    assert len(index.rows("saffron")) == 0
+
+
+def test_resolve_cache_depends_on_the_cutoff():
+    index = _index()
+    assert index.resolve("plum tomatoes pack") == TOMATOES
+    assert index.resolve("plum tomatoes pack", cutoff=0.9) is None
+    assert index.resolve("plum tomatoes pack") == TOMATOES
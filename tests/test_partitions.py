@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from partitions import partition_rows
+from snapshot import (
+    load_snapshot_sheet, prune_snapshots, snapshot_columns, snapshot_partitions, snapshots_available, write_snapshot,
+)
+
+SHEET = "Raw Data - Date Wise"
+
+
+def _shuffled_sales(rows=2000, weeks=12, seed=0):
+    rng = np.random.default_rng(seed)
+    days = rng.integers(0, weeks * 7, size=rows)
+    return pd.DataFrame({
+        "Item Description": rng.choice(["Kale", "Basil", "Thyme"], size=rows),
+        "Vendor Name": rng.choice(["Dubai Marina", "Musaffah"], size=rows),
+        "Local Order Date": pd.Timestamp("2024-12-02") + pd.to_timedelta(days, unit="D"),
+        "Sold Quantity": rng.integers(1, 6, size=rows),
+    })
+
+
+def _weeks(df):
+    iso = df["Local Order Date"].dt.isocalendar()
+    return set(zip(iso["year"], iso["week"]))
+
+
+def test_partition_rows_gives_one_partition_per_week_for_unsorted_rows():
+    df = _shuffled_sales()
+    parts = partition_rows(df, "Local Order Date")
+    assert len(parts) == len(_weeks(df))
+    assert [key for key, _ in parts] == sorted(_weeks(df))
+    assert sorted(np.concatenate([rows for _, rows in parts])) == list(range(len(df)))
+    # Rows keep their sheet order within a week
+    assert all((np.diff(rows) > 0).all() for _, rows in parts)
+
+
+def test_partition_rows_puts_undated_rows_last():
+    df = _shuffled_sales(rows=50)
+    df.loc[[3, 17], "Local Order Date"] = pd.NaT
+    parts = partition_rows(df, "Local Order Date")
+    assert parts[-1][0] is None
+    assert list(parts[-1][1]) == [3, 17]
+
+
+@pytest.mark.skipif(not snapshots_available(), reason="snapshots need pyarrow")
+def test_snapshot_of_shuffled_sheet_writes_one_part_per_week(tmp_path):
+    df = _shuffled_sales()
+    path = str(tmp_path / "w.xlsx")
+    write_snapshot(path, "v1", {SHEET: df})
+
+    parts = snapshot_partitions(path, "v1", SHEET)
+    assert len(parts) == len(_weeks(df))
+    assert len(list((tmp_path / "w.xlsx.snapshot" / "parts").iterdir())) == len(_weeks(df))
+
+    loaded = load_snapshot_sheet(path, "v1", SHEET)
+    assert len(loaded) == len(df)
+    assert loaded["Sold Quantity"].sum() == df["Sold Quantity"].sum()
+    iso = loaded["Local Order Date"].dt.isocalendar()
+    assert (iso["year"] * 100 + iso["week"]).is_monotonic_increasing
+
+
+@pytest.mark.skipif(not snapshots_available(), reason="snapshots need pyarrow")
+def test_prune_keeps_the_previous_version_readable(tmp_path):
+    path = str(tmp_path / "w.xlsx")
+    frames = [_shuffled_sales(rows=300, seed=seed) for seed in range(3)]
+    for version, df in zip(["v1", "v2", "v3"], frames):
+        write_snapshot(path, version, {SHEET: df}, prune=False)
+    prune_snapshots(path, keep="v3")
+
+    assert snapshot_partitions(path, "v1", SHEET) is None
+    # A dataset still serving v2 can read its sheet after v3 went live
+    assert len(load_snapshot_sheet(path, "v2", SHEET)) == len(frames[1])
+    assert len(load_snapshot_sheet(path, "v3", SHEET)) == len(frames[2])
+
+
+@pytest.mark.skipif(not snapshots_available(), reason="snapshots need pyarrow")
+def test_empty_partitioned_sheet_round_trips(tmp_path):
+    path = str(tmp_path / "w.xlsx")
+    empty = _shuffled_sales().iloc[0:0]
+    write_snapshot(path, "v1", {SHEET: empty})
+
+    assert snapshot_partitions(path, "v1", SHEET) == []
+    assert snapshot_columns(path, "v1", SHEET) == list(empty.columns)
+    loaded = load_snapshot_sheet(path, "v1", SHEET)
+    assert len(loaded) == 0
+    assert list(loaded.columns) == list(empty.columns)
+    assert len(load_snapshot_sheet(path, "v1", SHEET, ["Sold Quantity"]).columns) == 1
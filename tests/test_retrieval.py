@@ -0,0 +1,32 @@
+import pytest
+
+from benchmarks.synthetic_workbook import generate_sheets
+from dataset import Dataset
+from prepared_data import prepared_sales
+from retrieval import relevant_context, retrieval_index
+
+THYME = "Krispr Premium Thyme, 25g"
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    # 60 weeks from 2024-W49: week 3 occurs in 2025 and 2026
+    return Dataset("synthetic.xlsx", "v1", generate_sheets(3000, weeks=60))
+
+
+def _units(dataset, week):
+    rows = prepared_sales(dataset).week(week)
+    return rows.loc[rows["Item Description"] == THYME, "Sold Quantity"].sum()
+
+
+def test_weekly_sales_keep_years_apart(dataset):
+    table = retrieval_index(dataset).tables["Weekly Product Sales"]
+    for year in (2025, 2026):
+        row = table[(table["Year"] == year) & (table["Week"] == 3) & (table["Item Description"] == THYME)]
+        assert row["Units Sold"].tolist() == [_units(dataset, (year, 3))]
+
+
+def test_a_named_year_selects_its_rows(dataset):
+    context = relevant_context("how many units of thyme sold in week 3 of 2026", dataset)
+    assert f"2026 | 3 | {THYME} | {_units(dataset, (2026, 3))}" in context
+    assert "2025 | 3 |" not in context